@@ -3,18 +3,24 @@
 # Spring 2022
 
 # Import Modules
+import json
+import os
+from functools import lru_cache, partial
 import numpy as np
 # numpy verison=='1.22.2'
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
-import pandas as pd
-# pandas version='1.4.1'
+from dash import Dash, Patch, dcc, html, no_update
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
-import datetime
-from PIL import Image
-import plotly.graph_objects as go 
-from plotly.subplots import make_subplots
+from plotly.io.json import to_json_plotly
+import database
+from data import (load_data, memory_report, cube_mean, team_summary_from_cube, build_cube_masks, cube_filter,
+                  BACKEND, SEC_teams, TEAM_KEYS, TEAM_COLORS, TEAM_LOGOS)
+from figures import (set_data, data_version, get_figure, figure_names, figure_cache_info, add_background_logo,
+                     build_viewership, build_attendance)
+from logos import logo_url, logo_bytes, register_logo_route
+from metrics import phase, register_cache, register_metrics
+from profiling import register_profiling
+from warmup import warm_up, start_warmup, register_health
 #from layouts import Page1Layout, Page2Layout
 
 ####### PRE DATA FUNCTIONS AND DICTIONARIES ###################################################################
@@ -30,362 +36,69 @@ def draw_graph(id,*args, **kwargs):
             ),
         ])
 
-# Color dictionary for every team's rgb
-color_dict = {'Tennessee':'rgb(255,130,0)',
-                  'Alabama':'rgb(158,27,50)',
-                  'Georgia':'rgb(186,12,47)',
-                  'Kentucky':'rgb(0,51,160)',
-                  'Florida':'rgb(0,33,165)',
-                  'South Carolina':'rgb(155,0,10)',
-                  'Vanderbilt':'rgb(134,109,75)',
-                  'Missouri':'rgb(0,0,0)',
-                  'LSU':'rgb(70,29,124)',
-                  'Auburn':'rgb(232,119,34)',
-                  'Texas A&M':'rgb(80,0,0)',
-                  'Arkansas':'rgb(157,34,53)',
-                  '(Ole Miss)':'rgb(204,9,47)',
-                  'Mississippi State':'rgb(93,23,37)'}
-
-# Function to choose correct logo
-def choose_logo(team):
-    if team == 'Georgia':
-        value = 'logos/UGA.png'
-    elif team == 'Alabama':
-        value = 'logos/UA.png'
-    elif team == 'Missouri':
-        value =  'logos/MU.png'
-    elif team == '(Ole Miss)':
-        value =  'logos/OM.png'
-    elif team == 'Mississippi State':
-        value = 'logos/MSU.png'
-    elif team == 'Florida':
-        value = 'logos/UF.png'
-    elif team == 'Tennessee':
-        value = 'logos/UT.png'
-    elif team == 'LSU':
-        value = 'logos/LSU.png'
-    elif team == 'Texas A&M':
-        value = 'logos/TAM.png'
-    elif team == 'Kentucky':
-        value = 'logos/UK.png'
-    elif team == 'Auburn' :
-        value =  'logos/AU.png'
-    elif team == 'Vanderbilt':
-        value = 'logos/VU.png'
-    elif team == 'Arkansas':
-        value = 'logos/UAK.png'
-    elif team == 'South Carolina':
-        value = 'logos/USC.png'
-    else: value = 'logos/SEC.png'
-    return value
-    
-
 ############## READ IN DATA #######################################################################################
-RATINGS = pd.read_csv('TV_Ratings_onesheet.csv')
-GAMES = pd.read_csv('games_flat_xml_2012-2018.csv')
-CAPACITY = pd.read_csv('capacity.csv')
-
-# this attendance value is a typo. 710,004 should be 71,004
-GAMES.loc[GAMES['attend'] > 200000,'attend'] = 71004
-
-# merge the 3 datasets
-MERGED = pd.merge(GAMES,RATINGS,how='inner',on='TeamIDsDate')
-# capacity is a custom dataset
-MERGED = pd.merge(MERGED,CAPACITY,on=['homename','stadium'])
-
-
-################# DATA ENGINEERING/CLEANING ##############################################
-# a KPI we will use is perecent of capacity
-MERGED['Percent_of_Capacity'] = MERGED['attend']/MERGED['Capacity']
-
-# turn the date column into an actual date
-MERGED['date'] = MERGED['date'].astype(np.datetime64)
-
-# Need to be able to make summary statistics by SEC team
-# List of SEC teams
-SEC_teams = ['Alabama','Arkansas','Auburn','Florida','Mississippi State','Kentucky','South Carolina',
-             'Ole Miss','Georgia','Tennessee','Texas A&M','LSU','Vanderbilt','Missouri']
-
-# One hot-encode SEC teams
-# A column for every team
-# 1 if that team was in the game (home or away) 0 otherwise
-for i in SEC_teams:
-    MERGED[i] = np.where(MERGED['Matchup_Full_TeamNames'].str.contains(i),1,0)
-
-# get summary statistics for each team
-d = []
-for i in SEC_teams:
-    df = MERGED.loc[MERGED[i]==1,:] 
-    d.append({
-        'Team':i,
-        'AvgViews':df['VIEWERS'].mean(),
-        'Avgattend':df.loc[df['homename'].str.contains(i),'Percent_of_Capacity'].mean(),
-        'AvgRating':df['RATING'].mean()
-    })
-# turn the list of dictionaries into a dataframe
-df = pd.DataFrame(d)
-# sort the data frame by team name
-df.sort_values('Team',inplace=True)
-
-# Engineer new variable: summed ranks of teams playing
-import plotly.graph_objects as go
-MERGED['rank_home'].unique()
-MERGED['rank_home'] = MERGED['rank_home'].replace({'character(0)':'26'})
-MERGED['rank_home'] = MERGED['rank_home'].astype(int)
-MERGED['rank_vis'].unique()
-MERGED['rank_vis'] = MERGED['rank_vis'].replace({'character(0)':'26'})
-MERGED['rank_vis'] = MERGED['rank_vis'].astype(int)
-MERGED['added_rank'] = MERGED['rank_home'] + MERGED['rank_vis']
-
-# Some variables to help with static graphs
-# define lists of individual rankings and viewers
-ranks = []
-views=[]
-ranks_vis=[]
-attend=[]
-
-# lists of individual ranks, teams, views, and percent cap
-ranks = [rank for rank in MERGED['rank_home']]
-home = [team for team in MERGED['homename']]
-ranks_vis = [rank for rank in MERGED['rank_vis']]
-vis = [team for team in MERGED['visname']]
-views = [views for views in MERGED['VIEWERS']]
-attend = [attend for attend in MERGED['Percent_of_Capacity']]
-
-attend.extend(attend)
-ranks.extend(ranks_vis)
-views.extend(views)
-teams = home + vis
-
-################### STATIC GRAPHS #########################################################
-# Define figures with average stats per team
-
-# avg viewers graph - 1st tab
-viewership = px.bar(data_frame=df,x='Team',y='AvgViews')
-viewership.add_hline(df['AvgViews'].mean(),
-            line_dash='dot',
-            annotation_text="<b>Average:<b> "+str("{:,}".format(np.int64(df['AvgViews'].mean()))), 
-            annotation_position="top right",
-            annotation_font_size=12,
-            annotation_font_color="red")
-viewership.update_layout(title={
-            'text':"Average TV Views Per Game by School",
-            'y':0.9,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'},
-        title_font_color="black",
-        xaxis_title="School",
-        yaxis_title="Number of Views")
-viewership.update_traces(marker_color='navy')
-viewership.layout.template = 'plotly_white'
-
-# avg attendance graph-1st tab
-attendance = px.bar(data_frame=df,x='Team',y='Avgattend')
-attendance.add_hline(df['Avgattend'].mean(),
-            line_dash='dot',
-            annotation_text="<b>Average:<b> "+str(np.round(df['Avgattend'].mean()*100,1))+'%', 
-            annotation_position="top right",
-            annotation_font_size=12,
-            annotation_font_color="red")
-attendance.update_traces(marker_color='navy')
-attendance.update_layout(title={
-            'text':"Average Percent of Capacity Per Game by School",
-            'y':0.9,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'},
-        title_font_color="black",
-        xaxis_title="School",
-        yaxis_title="Percent of Capacity",
-        yaxis={'tickformat':".0%"})
-attendance.layout.template = 'plotly_white'
-
-# summed rank graph - 3rd tab
-summed_ranks_data=MERGED['added_rank']
-summed_ranks = go.Figure(data=[go.Scatter(x=MERGED['added_rank'], y=MERGED['VIEWERS'], mode='markers',
-                                 marker=dict(color='navy'),
-                                 text=summed_ranks_data,
-                                 hovertemplate = "<b>Summed Rank of Teams: </b> %{text} <br>")])
-
-summed_ranks.update_xaxes(range=[0,51.5], title_text = 'Summed Rank of Teams per Game')
-summed_ranks.update_yaxes(title_text = 'Viewers per Game')
-summed_ranks.update_layout(title_text='Viewership by Matchup Weight')
-summed_ranks.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-summed_ranks.update_layout(template="plotly_white")
-
-# Figure for summed ranks against percent capacity - 3rd tab
-summed_rank_attend= go.Figure(data=[go.Scatter(x=MERGED['added_rank'], y=MERGED['Percent_of_Capacity'], mode='markers',
-                                 marker=dict(color='navy'),
-                                 text=summed_ranks_data,
-                                 hovertemplate = "<b>Summed Rank of Teams: </b> %{text} <br>")])
-                            
-summed_rank_attend.update_xaxes(range=[0,51.5], title_text = 'Summed Rank of Teams per Game')
-summed_rank_attend.update_yaxes(range=[.6,1.2], title_text = 'Percent of Capacity per Game')
-summed_rank_attend.update_layout(title_text='Percent of Capacity by Matchup Weight',yaxis={'tickformat':".0%"})
-summed_rank_attend.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-summed_rank_attend.update_layout(template="plotly_white")
-
-
-# Networks Graph and summed ranks - 3rd tab
-y0 = MERGED.loc[MERGED['Network']=='CBS',['added_rank','VIEWERS']]
-y1 = MERGED.loc[MERGED['Network']=='ESPN',['added_rank','VIEWERS']]
-y3 = MERGED.loc[MERGED['Network']=='ESPN2',['added_rank','VIEWERS']]
-y4 = MERGED.loc[MERGED['Network']=='ABC',['added_rank','VIEWERS']]
-
-
-networks = go.Figure()
-networks.add_trace(go.Box(y=y0['added_rank'], name='CBS', boxpoints='all'))
-networks.add_trace(go.Box(y=y1['added_rank'], name='ESPN', boxpoints='all'))
-networks.add_trace(go.Box(y=y3['added_rank'], name='ESPN2',boxpoints='all'))
-networks.add_trace(go.Box(y=y4['added_rank'], name='ABC',boxpoints='all'))
-
-
-networks.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-networks.update_layout(template="plotly_white")
-networks.update_xaxes( title_text = 'Network')
-networks.update_yaxes(title_text = 'Summed Rank')
-networks.update_layout(title_text='Weighted Matchup Distribution by Network')
-
-
-# Viewership by network graph
-network_views = go.Figure()
-network_views.add_trace(go.Box(y=y0['VIEWERS'], name='CBS', boxpoints='all'))
-network_views.add_trace(go.Box(y=y1['VIEWERS'], name='ESPN', boxpoints='all'))
-network_views.add_trace(go.Box(y=y3['VIEWERS'], name='ESPN2',boxpoints='all'))
-network_views.add_trace(go.Box(y=y4['VIEWERS'], name='ABC',boxpoints='all'))
-
-
-network_views.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-network_views.update_layout(template="plotly_white")
-network_views.update_xaxes( title_text = 'Network')
-network_views.update_yaxes(title_text = 'Number of Views')
-network_views.update_layout(title_text='TV Viewership Distribution by Network')
-
-# Figure for ranks of single teams - 3rd tab
-ranks_views = go.Figure(data=[go.Scatter(x=ranks, y=views, mode='markers',
-                                 marker=dict(color='navy'),
-                                 text=teams,
-                                 hovertemplate = "<b>Team: </b> %{text} <br>"
-                                 )])
-ranks_views.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-ranks_views.update_layout(template="plotly_white")
-ranks_views.update_xaxes( title_text = 'Ranking')
-ranks_views.update_yaxes(title_text = 'Views')
-ranks_views.update_layout(title_text='Viewership by Ranking')
-
-# Figure with ranks against percent capacity - 3rd tab
-ranks_attend = go.Figure(data=[go.Scatter(x=ranks, y=attend, mode='markers',
-                                 marker=dict(color='navy'),
-                                 text=teams,
-                                 hovertemplate = "<b>Team: </b> %{text} <br>"
-                                 )])
-ranks_attend.add_layout_image(
-    dict(
-        source= Image.open('logos/SEC.png'),
-        xref="x domain",
-        yref="y domain",
-        x=0.5,
-        y=0.5,
-        xanchor="center",
-        yanchor="middle",
-        sizex=45,
-        sizey=0.9,
-        opacity=0.1,
-        layer='below')
-    )
-    # Set templates
-ranks_attend.update_layout(template="plotly_white")
-ranks_attend.update_xaxes( title_text = 'Ranking')
-ranks_attend.update_yaxes(title_text = 'Percent of Capacity')
-ranks_attend.update_layout(title_text='Percent of Capacity by Ranking',yaxis={'tickformat':".0%"})
+# MERGED is the cleaned games/ratings/capacity table, CUBE the sums and counts
+# by team, season, home/away and network, df the per-team summary from CUBE
+# both come from the on-disk snapshot when the source files have not changed
+# with SEC_MMAP_COLUMNS=1 the numeric columns are memory-mapped so workers share them
+# with SEC_BACKEND=sqlite there is no CUBE, the aggregates are queried from the
+# database file and MERGED is its merged table, read by column (see database.py)
+SQL_BACKEND = BACKEND == 'sqlite'
+if SQL_BACKEND:
+    MERGED, CUBE = database.load_data(), None
+    df = database.team_summary()
+else:
+    MERGED, CUBE = load_data(mmap=os.environ.get('SEC_MMAP_COLUMNS', '0') == '1')
+    df = team_summary_from_cube(CUBE)
+    print(memory_report(MERGED))
+
+# the static figures for tab 1 and tab 3 are built on first use
+set_data(MERGED, df)
 
 ########################## OTHER APP PREP ######################################
-# Creating an object for "options" in the dropdown menu.
-team_names_dict = [{'label': 'Georgia', 'value': 'Georgia'},
-                   {'label': 'Alabama', 'value': 'Alabama'},
-                   {'label': 'Missouri', 'value': 'Missouri'},
-                   {'label': 'Ole Miss', 'value': '(Ole Miss)'},
-                   {'label': 'Mississippi State', 'value': 'Mississippi State'},
-                   {'label': 'Florida', 'value': 'Florida'},
-                   {'label': 'Tennessee', 'value': 'Tennessee'},
-                   {'label': 'LSU', 'value': 'LSU'},
-                   {'label': 'Texas A&M', 'value': 'Texas A&M'},
-                   {'label': 'Kentucky', 'value': 'Kentucky'},
-                   {'label': 'Auburn', 'value': 'Auburn'},
-                   {'label': 'Vanderbilt', 'value': 'Vanderbilt'},
-                   {'label': 'Arkansas', 'value': 'Arkansas'},
-                   {'label': 'South Carolina', 'value': 'South Carolina'}]
+# Creating an object for "options" in the dropdown menu, the values are team keys
+team_names_dict = [{'label': team, 'value': TEAM_KEYS[team]}
+                   for team in ['Georgia', 'Alabama', 'Missouri', 'Ole Miss', 'Mississippi State', 'Florida',
+                                'Tennessee', 'LSU', 'Texas A&M', 'Kentucky', 'Auburn', 'Vanderbilt', 'Arkansas',
+                                'South Carolina']]
+
+# how many team figure pairs to keep, least recently used are dropped first
+TEAM_FIGURE_CACHE_SIZE = int(os.environ.get('SEC_FIGURE_CACHE_SIZE', 64))
+
+# teams the tab 2 dropdowns start on
+DEFAULT_TEAMS = {'dropdown1': TEAM_KEYS['Tennessee'], 'dropdown2': TEAM_KEYS['Alabama']}
+
+# draw the tab 2 team figures in the browser from a preloaded store
+# instead of a server round trip on every dropdown change
+CLIENTSIDE_TEAMS = os.environ.get('SEC_CLIENTSIDE_TEAMS', '0') == '1'
+
+# the tabs of the app
+TABS = [('tab-1', 'Best Branded Teams'),
+        ('tab-2', 'Team Branding Comparison'),
+        ('tab-3', 'Factors Associated with Good Branding')]
+
+# put every tab in the page at load and switch tabs in the browser
+PRELOAD_TABS = os.environ.get('SEC_PRELOAD_TABS', '0') == '1'
+
+# masks over the cube cells for the tab 1 filters
+CUBE_MASKS = None if SQL_BACKEND else build_cube_masks(CUBE)
+
+# how many tab 1 filter combinations to keep the figures of
+FILTER_CACHE_SIZE = int(os.environ.get('SEC_FILTER_CACHE_SIZE', 128))
+
+# cube values kept by each choice of the home/away and postseason filters
+HOME_FILTERS = {'all': None, 'home': (True,), 'away': (False,)}
+POSTSEASON_FILTERS = {'all': None, 'regular': (False,), 'postseason': (True,)}
+
+# Swap in new data while the app is running, e.g. MERGED and the cube from data.ingest
+# (pandas backend, the sqlite one picks up a rebuilt database on restart)
+# the figure and layout caches are keyed on the data version so they rebuild on next use
+def update_data(new_MERGED, new_CUBE):
+    global MERGED, CUBE, CUBE_MASKS, df
+    MERGED, CUBE = new_MERGED, new_CUBE
+    CUBE_MASKS = build_cube_masks(CUBE)
+    df = team_summary_from_cube(CUBE)
+    set_data(MERGED, df)
 
 ###################### APP #####################################################
 # initialize the app
@@ -395,42 +108,193 @@ app = Dash(suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.B
                   ]
               )
 
-# layout
-app.layout = html.Div([
-
-    # sec logo and slogan
-    html.Img(src = Image.open('logos\SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
-    html.H1('"It Just Means More"', style={'width': '90%','display': 'inline-block'}),
-    
-    # create 3 tabs
-    dcc.Tabs(id="tabs", value='tab-1', children=[
-        dcc.Tab(label='Best Branded Teams', value='tab-1'),
-        dcc.Tab(label='Team Branding Comparison', value='tab-2'),
-        dcc.Tab(label='Factors Associated with Good Branding', value='tab-3')
-    ]),
-    html.Div(id='tabs-content')
+# logos are served as cached static files, see logos.py
+register_logo_route(app.server)
+
+# callback latency, response size, errors, startup phases and caches at /metrics
+register_metrics(app.server, app.callback_map)
+
+# opt-in profiling of callbacks, see profiling.py
+register_profiling(app.server)
+
+# /health and /ready, ready once the caches are warmed up, see warmup.py
+register_health(app.server)
+
+# Average percent of capacity (home games) and viewers (all games) by year for one team
+# summed from the cells of the cube, MERGED is not scanned
+def team_yearly(team):
+    if SQL_BACKEND:
+        return database.team_yearly(team)
+    team_POC = cube_mean(CUBE, 'Percent_of_Capacity', 'season', team=team, home=True)
+    team_Views = cube_mean(CUBE, 'VIEWERS', 'season', team=team)
+    return team_POC, team_Views
+
+# The same for several teams in one grouped pass over the cube
+# each series is indexed by (team, season)
+def teams_yearly(teams):
+    if SQL_BACKEND:
+        return database.teams_yearly(teams)
+    teams_POC = cube_mean(CUBE, 'Percent_of_Capacity', ['team', 'season'], team=list(teams), home=True)
+    teams_Views = cube_mean(CUBE, 'VIEWERS', ['team', 'season'], team=list(teams))
+    return teams_POC, teams_Views
+
+# Percent of capacity and viewers by year for any number of teams, a line per team
+# Cached per (teams, data version), teams is a tuple in the order they were chosen
+@lru_cache(maxsize=TEAM_FIGURE_CACHE_SIZE)
+def multi_team_figures(teams, version):
+    import plotly.graph_objects as go
+    teams_POC, teams_Views = teams_yearly(teams)
+    order = {team: i for i, team in enumerate(teams)}
+    figures = []
+    for series, title, y_title, y_range, y_format in [
+            (teams_POC, 'Percent Capacity per Game by Year', 'Percent Capacity (Avg)', [0.65,1.03], '.0%'),
+            (teams_Views, 'Viewership per Game by Year', 'Average Number of Viewers', [500000,7500000], None)]:
+        fig = go.Figure()
+        lines = sorted(series.groupby(level='team'), key=lambda line: order[line[0]])
+        for team, line in lines:
+            fig.add_trace(go.Scatter(x=line.index.get_level_values('season').tolist(), y=line.tolist(),
+                                     mode='lines', name=SEC_teams[team], line_color=TEAM_COLORS[team]))
+        fig.update_xaxes(title_text = 'Year')
+        fig.update_yaxes(range=y_range, title_text = y_title, tickformat=y_format)
+        fig.update_layout(title_text=title, template="plotly_white")
+        add_background_logo(fig)
+        figures.append(fig.to_dict())
+    return tuple(figures)
+
+# Percent of capacity and viewers by year for one team, shared by both dropdowns
+# Cached per (team, data version), hits/misses are in team_figures.cache_info()
+# The figures are kept as plain dicts so they are only converted once
+@lru_cache(maxsize=TEAM_FIGURE_CACHE_SIZE)
+def team_figures(team, version):
+    import plotly.express as px
+    team_POC, team_Views = team_yearly(team)
 
+    # get logo in background of graph
+    image = TEAM_LOGOS[team]
 
-])
+    # time series of percent capacity
+    fig_POC = px.line(x=team_POC.index,y=team_POC)
+    fig_POC.update_xaxes(title_text = 'Year')
+    fig_POC.update_yaxes(range=[0.65,1.03],title_text = 'Percent Capacity (Avg)')
+    fig_POC.update_layout(title_text='Percent Capacity per Game by Year',yaxis={'tickformat':".0%"})
+    fig_POC.update_traces(line_color=TEAM_COLORS[team])
+    add_background_logo(fig_POC, image, opacity=0.3)
+    fig_POC.update_layout(template="plotly_white")
 
-# callback for choosing tabs
-@app.callback(Output('tabs-content', 'children'),
-              Input('tabs', 'value'))
-def render_content(tab):
+    # time series of viewers
+    fig_Views = px.line(x=team_Views.index,y=team_Views)
+    fig_Views.update_xaxes(title_text = 'Year')
+    fig_Views.update_yaxes(range=[500000,7500000],title_text = 'Average Number of Viewers')
+    fig_Views.update_layout(title_text= 'Viewership per Game by Year')
+    fig_Views.update_traces(line_color=TEAM_COLORS[team])
+    add_background_logo(fig_Views, image, opacity=0.3)
+    fig_Views.update_layout(template="plotly_white")
+    return fig_POC.to_dict(), fig_Views.to_dict()
+
+# What differs between two teams' figures: the yearly series, line color and logo
+# Cached per (team, data version)
+@lru_cache(maxsize=TEAM_FIGURE_CACHE_SIZE)
+def team_series(team, version):
+    team_POC, team_Views = team_yearly(team)
+    return {'poc_x':team_POC.index.tolist(), 'poc_y':team_POC.tolist(),
+            'views_x':team_Views.index.tolist(), 'views_y':team_Views.tolist(),
+            'color':TEAM_COLORS[team], 'logo':logo_url(TEAM_LOGOS[team])}
+
+# Property updates that turn the figure pair in the page into one team's
+# only the line data, its color and the background logo are sent
+def team_patches(team, version):
+    series = team_series(team, version)
+    patches = []
+    for x, y in [('poc_x', 'poc_y'), ('views_x', 'views_y')]:
+        patch = Patch()
+        patch['data'][0]['x'] = series[x]
+        patch['data'][0]['y'] = series[y]
+        patch['data'][0]['line']['color'] = series['color']
+        patch['layout']['images'][0]['source'] = series['logo']
+        patches.append(patch)
+    return tuple(patches)
+
+# Everything the browser needs to draw any team's figures without the server
+# the two figures of one team are the base, the yearly series, color and logo
+# of every team are swapped into them by assets/team_switch.js
+@lru_cache(maxsize=1)
+def team_store(version):
+    # json object keys are strings, the browser looks teams up by key either way
+    teams = {str(option['value']): team_series(option['value'], version) for option in team_names_dict}
+    return {'base':team_figures(team_names_dict[0]['value'], version), 'teams':teams}
+
+# Team graph of tab 2, with the figures of the dropdown's first team when
+# the server callbacks patch it, empty when it is drawn in the browser
+def team_graph(id, team, which):
+    if CLIENTSIDE_TEAMS:
+        return dcc.Graph(id = id)
+    return dcc.Graph(id = id, figure = team_figures(team, data_version())[which])
+
+# Text and logo of the three "Highest Avg" cards on tab 1 for a team summary
+def best_cards(df):
+    cards = []
+    for column, title, value in [('AvgViews', 'Highest Avg TV Viewers: ', lambda v: "{:,}".format(np.int64(v))),
+                                 ('AvgRating', 'Highest Avg TV Rating: ', lambda v: "{:,}".format(np.round(v))),
+                                 ('Avgattend', 'Highest Avg Stadium Capacity: ', lambda v: format(v*100, '.1f')+'%')]:
+        if df[column].notna().any():
+            best = df.loc[df[column].idxmax(), 'TeamKey']
+            cards.append((title + value(df[column].max()), logo_url(TEAM_LOGOS[best])))
+        else:
+            cards.append((title + 'no games', logo_url('logos/SEC.png')))
+    return cards
+
+# Season range, network, home/away and postseason filters of tab 1
+# seasons and networks are the ones in the cube, or in the database
+def tab1_filters():
+    if SQL_BACKEND:
+        seasons, networks = database.seasons(), database.networks()
+    else:
+        seasons = sorted(int(season) for season in CUBE.index.get_level_values('season').unique())
+        networks = sorted(CUBE.index.get_level_values('network').dropna().unique())
+    return dbc.Row([
+        dbc.Col([
+            html.H6('Seasons'),
+            dcc.RangeSlider(min=seasons[0], max=seasons[-1], step=1, value=[seasons[0], seasons[-1]],
+                            marks={season: str(season) for season in seasons}, id='season-range'),
+        ], width=4),
+        dbc.Col([
+            html.H6('Networks'),
+            dcc.Dropdown(options=networks, value=[], multi=True, placeholder='All networks', id='network-filter'),
+        ], width=4),
+        dbc.Col([
+            html.H6('Games'),
+            dcc.RadioItems(options=[{'label': 'All', 'value': 'all'}, {'label': 'Home', 'value': 'home'},
+                                    {'label': 'Away', 'value': 'away'}],
+                           value='all', inline=True, id='home-filter'),
+        ], width=2),
+        dbc.Col([
+            html.H6('Season type'),
+            dcc.RadioItems(options=[{'label': 'All', 'value': 'all'}, {'label': 'Regular', 'value': 'regular'},
+                                    {'label': 'Postseason', 'value': 'postseason'}],
+                           value='all', inline=True, id='postseason-filter'),
+        ], width=2),
+    ], align='center')
+
+# Component tree of one tab
+def build_tab(tab):
     if tab == 'tab-1':
+        cards = best_cards(df)
         return  html.Div([ 
             # create row of cards with best branded teams
             dbc.Card(
                 dbc.CardBody([
+                    # filters the bars and cards are computed for
+                    tab1_filters(),
+                    html.Br(),
                     dbc.Row([
                         dbc.Col([
                             html.Div([
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by viewers
-                                        html.Img(src = Image.open('logos/UA.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = cards[0][1], id='best-views-logo', style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
-                                            html.H4('Highest Avg TV Viewers: '+str("{:,}".format(np.int64(df['AvgViews'].max())))), #id='placeholder2'),
+                                            html.H4(cards[0][0], id='best-views'),
                                             ], style={'textAlign': 'center'})
                                         ])
                                 ),])
@@ -440,9 +304,9 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by ratings
-                                        html.Img(src = Image.open('logos/UA.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = cards[1][1], id='best-rating-logo', style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
-                                            html.H4('Highest Avg TV Rating: ' + str("{:,}".format(np.round(df['AvgRating'].max()),2))), #id='placeholder3'),
+                                            html.H4(cards[1][0], id='best-rating'),
                                             ], style={'textAlign': 'center'}) 
                                         ])
                                     ),
@@ -453,9 +317,9 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by %capacity
-                                        html.Img(src = Image.open('logos/UGA.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = cards[2][1], id='best-attend-logo', style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
-                                            html.H4('Highest Avg Stadium Capacity: '+format(df['Avgattend'].max()*100, '.1f')+'%'), #id='placeholder4'),
+                                            html.H4(cards[2][0], id='best-attend'),
                                             ], style={'textAlign': 'center'})
                                         ])
                                     ),
@@ -467,10 +331,10 @@ def render_content(tab):
                     # graphs with average stadium capacity and viewership per team
                     dbc.Row([
                         dbc.Col([
-                            draw_graph(id='viewership',figure=viewership) 
+                            draw_graph(id='viewership',figure=get_figure('viewership')) 
                         ], width=6),
                         dbc.Col([
-                            draw_graph(id='attendance',figure=attendance)
+                            draw_graph(id='attendance',figure=get_figure('attendance'))
                         ], width=6),
                     ], align='center'), 
                     html.Br(),     
@@ -490,13 +354,13 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # choose 1st team to compare
-                                        html.Img(src = Image.open('logos/SEC.png'), 
+                                        html.Img(src = logo_url('logos/SEC.png'), 
                                                  style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
                                             html.Div([
                                                 html.H4('Choose A Team: ' ),
                                                 dcc.Dropdown(options = team_names_dict, 
-                                                             value = 'Tennessee',
+                                                             value = DEFAULT_TEAMS['dropdown1'],
                                                              id = "dropdown1"
                                                     ),
                                                 ], style={'textAlign': 'center'})
@@ -509,12 +373,12 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # choose 2nd team to compare
-                                        html.Img(src = Image.open('logos/SEC.png'), 
+                                        html.Img(src = logo_url('logos/SEC.png'), 
                                                  style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
                                             html.H4('Choose A Team: ' ),
                                             dcc.Dropdown(options = team_names_dict, 
-                                                         value = 'Alabama',
+                                                         value = DEFAULT_TEAMS['dropdown2'],
                                                          id = "dropdown2"
                                                         ),
                                             ], style={'textAlign': 'center'})
@@ -525,18 +389,44 @@ def render_content(tab):
                     ], align='center'), 
                     html.Br(),
                     
+                    # yearly series for every team when the figures are drawn in the browser
+                    dcc.Store(id='team-store', data=team_store(data_version()) if CLIENTSIDE_TEAMS else None),
+
                     # time series of viewership for both teams
                     dbc.Row([
                         dbc.Col([
-                            dcc.Graph(id = 'time-series1'),
-                            dcc.Graph(id = 'time-series3') 
+                            team_graph('time-series1', DEFAULT_TEAMS['dropdown1'], 0),
+                            team_graph('time-series3', DEFAULT_TEAMS['dropdown1'], 1)
                         ], width=6),
                         dbc.Col([
-                            dcc.Graph(id = 'time-series2'),
-                            dcc.Graph(id = 'time-series4')
+                            team_graph('time-series2', DEFAULT_TEAMS['dropdown2'], 0),
+                            team_graph('time-series4', DEFAULT_TEAMS['dropdown2'], 1)
                         ], width=6),
                     ], align='center'), 
-                    html.Br(),     
+                    html.Br(),
+
+                    # any number of teams on the same charts
+                    dbc.Card(
+                        dbc.CardBody([
+                            html.H4('Compare Teams: '),
+                            dcc.Dropdown(options = team_names_dict,
+                                         value = list(DEFAULT_TEAMS.values()),
+                                         multi = True,
+                                         id = "team-multi"
+                                ),
+                        ], style={'textAlign': 'center'})
+                    ),
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Graph(id = 'multi-poc',
+                                      figure = multi_team_figures(tuple(DEFAULT_TEAMS.values()), data_version())[0])
+                        ], width=6),
+                        dbc.Col([
+                            dcc.Graph(id = 'multi-views',
+                                      figure = multi_team_figures(tuple(DEFAULT_TEAMS.values()), data_version())[1])
+                        ], width=6),
+                    ], align='center'),
+                    html.Br(),
                 ]), color = 'light'
             )
         ])
@@ -551,7 +441,7 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by viewers
-                                        html.Img(src = Image.open('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = logo_url('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
                                             html.H4('Weighted Rank of Matchup'), #id='placeholder2'),
                                             html.H6('*Teams Outside the Top 25: Ranking = 26')
@@ -564,7 +454,7 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by ratings
-                                        html.Img(src = Image.open('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = logo_url('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
                                             html.H4('TV Network Comparison' ), #id='placeholder3'),
                                             ], style={'textAlign': 'center'})
@@ -577,7 +467,7 @@ def render_content(tab):
                                 dbc.Card(
                                     dbc.CardBody([
                                         # best branded team by %capacity
-                                        html.Img(src = Image.open('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+                                        html.Img(src = logo_url('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
                                         html.Div([
                                             html.H4('Individual Team Rankings'), #id='placeholder4'),
                                             html.H6('*Teams Outside the Top 25: Ranking = 26')
@@ -593,16 +483,16 @@ def render_content(tab):
                     # graphs with average stadium capacity and viewership per team, as well as network graphs
                     dbc.Row([
                         dbc.Col([
-                            draw_graph(id='summed_ranks',figure=summed_ranks), 
-                            draw_graph(id='summed_rank_attend', figure=summed_rank_attend) 
+                            draw_graph(id='summed_ranks',figure=get_figure('summed_ranks')), 
+                            draw_graph(id='summed_rank_attend', figure=get_figure('summed_rank_attend')) 
                         ], width=4),
                         dbc.Col([
-                            draw_graph(id='network_views',figure=network_views),
-                            draw_graph(id='networks',figure=networks) 
+                            draw_graph(id='network_views',figure=get_figure('network_views')),
+                            draw_graph(id='networks',figure=get_figure('networks')) 
                         ], width=4),
                         dbc.Col([
-                            draw_graph(id='ranks_views',figure=ranks_views),
-                            draw_graph(id='ranks_attend', figure=ranks_attend) 
+                            draw_graph(id='ranks_views',figure=get_figure('ranks_views')),
+                            draw_graph(id='ranks_attend', figure=get_figure('ranks_attend')) 
                         ], width=4),
                     ], align='center'), 
                     html.Br(),     
@@ -610,142 +500,166 @@ def render_content(tab):
             )
         ])
 
-# Callbacks
+# layout
+app.layout = html.Div([
 
-# callback for 1st dropdown, 2 outputs
-@app.callback(
-    Output('time-series1','figure'),
-    Output('time-series3', 'figure'),
-    Input('dropdown1','value')
-)
-def update_graph(team1):
-    # 1st dropdown
-    new_df = MERGED.loc[MERGED['Matchup_Full_TeamNames'].str.contains(team1),['date','VIEWERS','Percent_of_Capacity','homename']]
-    new_df.sort_values('date',inplace=True)
-
-    team1_POC = (new_df.loc[new_df['homename'].str.contains(team1),['date','Percent_of_Capacity']]
-                 .groupby(new_df['date'].map(lambda x: x.year))['Percent_of_Capacity'].mean())
-    team1_Views = new_df.groupby(new_df['date'].map(lambda x: x.year))['VIEWERS'].mean()
-    
-    # time series of percent capacity
-    fig1 = px.line(x=team1_POC.index,y=team1_POC)
-    fig1.update_xaxes(title_text = 'Year')
-    fig1.update_yaxes(range=[0.65,1.03],title_text = 'Percent Capacity (Avg)')
-    fig1.update_layout(title_text='Percent Capacity per Game by Year',yaxis={'tickformat':".0%"})
-    fig1.update_traces(line_color=color_dict[team1]) 
-    
-    # get logo in background of graph
-    image = choose_logo(team1) 
-    fig1.add_layout_image(
-        dict(
-            source= Image.open(image),
-            xref="x domain",
-            yref="y domain",
-            x=0.5,
-            y=0.5,
-            xanchor="center",
-            yanchor="middle",
-            sizex=45,
-            sizey=0.9,
-            opacity=0.3,
-            layer='below')
-        )
-    fig1.update_layout(template="plotly_white") 
-    
-    # time series of viewers
-    fig3 = px.line(x=team1_Views.index,y=team1_Views)
-    
-    fig3.update_xaxes(title_text = 'Year')
-    fig3.update_yaxes(range=[500000,7500000],title_text = 'Average Number of Viewers')
-    fig3.update_layout(title_text= 'Viewership per Game by Year')
-    fig3.update_traces(line_color=color_dict[team1]) 
+    # sec logo and slogan
+    html.Img(src = logo_url('logos/SEC.png'), style={'height':'8%', 'width':'8%', 'display': 'inline-block'}),
+    html.H1('"It Just Means More"', style={'width': '90%','display': 'inline-block'}),
     
-    # get logo in background of graph
-    image = choose_logo(team1) 
-    fig3.add_layout_image(
-        dict(
-            source= Image.open(image),
-            xref="x domain",
-            yref="y domain",
-            x=0.5,
-            y=0.5,
-            xanchor="center",
-            yanchor="middle",
-            sizex=45,
-            sizey=0.9,
-            opacity=0.3,
-            layer='below')
-        )
-    fig3.update_layout(template="plotly_white") 
-    return fig1, fig3
-
-# callback for 2nd dropdown, 2 outputs
+    # create 3 tabs
+    dcc.Tabs(id="tabs", value='tab-1', children=[
+        dcc.Tab(label=label, value=tab) for tab, label in TABS
+    ]),
+    # when preloading every tab is in the page and the selected one is shown
+    html.Div(id='tabs-content', children=[
+        html.Div(build_tab(tab), id=tab + '-content', style={'display': 'block' if tab == 'tab-1' else 'none'})
+        for tab, label in TABS
+    ] if PRELOAD_TABS else None)
+
+
+])
+
+# Layout of each tab, built once per data version and kept already converted to json
+@lru_cache(maxsize=8)
+def tab_layout(tab, version):
+    return json.loads(to_json_plotly(build_tab(tab)))
+
+# tabs are either all in the page and shown/hidden in the browser
+# or sent from the cache when they are chosen
+if PRELOAD_TABS:
+    app.clientside_callback(
+        ClientsideFunction(namespace='sec', function_name='show_tab'),
+        [Output(tab + '-content', 'style') for tab, label in TABS],
+        Input('tabs', 'value')
+    )
+else:
+    # callback for choosing tabs
+    @app.callback(Output('tabs-content', 'children'),
+                  Input('tabs', 'value'))
+    def render_content(tab):
+        return tab_layout(tab, data_version())
+
+# Tab 1 figures and card texts and logos for one choice of filters
+# Cached per (filters, data version), the filters only select cube cells (or the rows of one query)
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def tab1_filtered(seasons, networks, home, postseason, version):
+    if SQL_BACKEND:
+        filtered = database.team_summary(season=seasons, network=networks, home=home, postseason=postseason)
+    else:
+        mask = cube_filter(CUBE_MASKS, season=seasons, network=networks, home=home, postseason=postseason)
+        filtered = team_summary_from_cube(CUBE, mask)
+    cards = best_cards(filtered)
+    return (build_viewership(MERGED, filtered).to_dict(), build_attendance(MERGED, filtered).to_dict(),
+            *[text for text, logo in cards], *[logo for text, logo in cards])
+
+# callback for the tab 1 filters, the unfiltered figures are already in the layout
 @app.callback(
-    Output('time-series2','figure'),
-    Output('time-series4', 'figure'),
-    Input('dropdown2','value')
+    Output('viewership', 'figure'),
+    Output('attendance', 'figure'),
+    Output('best-views', 'children'),
+    Output('best-rating', 'children'),
+    Output('best-attend', 'children'),
+    Output('best-views-logo', 'src'),
+    Output('best-rating-logo', 'src'),
+    Output('best-attend-logo', 'src'),
+    Input('season-range', 'value'),
+    Input('network-filter', 'value'),
+    Input('home-filter', 'value'),
+    Input('postseason-filter', 'value'),
+    prevent_initial_call=True
 )
-def update_graph(team2):
-    new_df = MERGED.loc[MERGED['Matchup_Full_TeamNames'].str.contains(team2),['date','VIEWERS','Percent_of_Capacity','homename']]
-    new_df.sort_values('date',inplace=True)
+def filter_tab1(season_range, networks, home, postseason):
+    return tab1_filtered(tuple(range(season_range[0], season_range[1] + 1)),
+                         tuple(sorted(networks)) if networks else None,
+                         HOME_FILTERS[home], POSTSEASON_FILTERS[postseason], data_version())
+
+# caches reported at /metrics
+register_cache('figures', figure_cache_info)
+register_cache('team_figures', team_figures.cache_info)
+register_cache('team_series', team_series.cache_info)
+register_cache('multi_team_figures', multi_team_figures.cache_info)
+register_cache('team_store', team_store.cache_info)
+register_cache('tab_layout', tab_layout.cache_info)
+register_cache('tab1_filtered', tab1_filtered.cache_info)
+register_cache('logos', logo_bytes.cache_info)
+
+# Every figure, team figure pair and tab layout for the current data, as (name, task)
+def warmup_tasks():
+    version = data_version()
+    tasks = [('figure ' + name, partial(get_figure, name)) for name in figure_names()]
+    tasks += [('team ' + option['label'], partial(team_series, option['value'], version))
+              for option in team_names_dict]
+    if CLIENTSIDE_TEAMS:
+        tasks.append(('team store', partial(team_store, version)))
+    tasks += [('layout ' + tab, partial(tab_layout, tab, version)) for tab, label in TABS]
+    return tasks
+
+# Build everything in warmup_tasks before returning, so no request pays
+# for it, e.g. before forking workers
+@phase('precompute')
+def precompute():
+    warm_up(warmup_tasks())
 
-    team2_POC = (new_df.loc[new_df['homename'].str.contains(team2),['date','Percent_of_Capacity']]
-                 .groupby(new_df['date'].map(lambda x: x.year))['Percent_of_Capacity'].mean())
-    team2_Views = new_df.groupby(new_df['date'].map(lambda x: x.year))['VIEWERS'].mean()
-    
-    # time series of percent capacity
-    fig2 = px.line(x=team2_POC.index,y=team2_POC)
-    fig2.update_xaxes(title_text = 'Year')
-    fig2.update_yaxes(range=[0.65,1.03],title_text = 'Percent Capacity (Avg)')
-    fig2.update_layout(title_text='Percent Capacity per Game by Year',yaxis={'tickformat':".0%"})
-    fig2.update_traces(line_color=color_dict[team2]) 
-    
-    # get logo in background of graph
-    image = choose_logo(team2) 
-    fig2.add_layout_image(
-        dict(
-            source= Image.open(image),
-            xref="x domain",
-            yref="y domain",
-            x=0.5,
-            y=0.5,
-            xanchor="center",
-            yanchor="middle",
-            sizex=45,
-            sizey=0.9,
-            opacity=0.3,
-            layer='below')
-        )
-    fig2.update_layout(template="plotly_white") 
-    
-    # time series of viewers
-    fig4 = px.line(x=team2_Views.index,y=team2_Views)
-    
-    fig4.update_xaxes(title_text = 'Year')
-    fig4.update_yaxes(range=[500000,7500000],title_text = 'Average Number of Viewers')
-    fig4.update_layout(title_text= 'Viewership per Game by Year')
-    fig4.update_traces(line_color=color_dict[team2]) 
-    
-    # get logo in background of graph
-    image = choose_logo(team2) 
-    fig4.add_layout_image(
-        dict(
-            source= Image.open(image),
-            xref="x domain",
-            yref="y domain",
-            x=0.5,
-            y=0.5,
-            xanchor="center",
-            yanchor="middle",
-            sizex=45,
-            sizey=0.9,
-            opacity=0.3,
-            layer='below')
-        )
-    fig4.update_layout(template="plotly_white") 
-    return fig2, fig4
+# Callbacks
 
-if __name__ == '__main__':
-    app.run_server(debug=True) 
-    
+# team figures are either swapped in the browser from the team store
+# or built on the server, one callback per dropdown
+if CLIENTSIDE_TEAMS:
+    app.clientside_callback(
+        ClientsideFunction(namespace='sec', function_name='team_figures'),
+        Output('time-series1','figure'),
+        Output('time-series3', 'figure'),
+        Input('dropdown1','value'),
+        State('team-store','data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='sec', function_name='team_figures'),
+        Output('time-series2','figure'),
+        Output('time-series4', 'figure'),
+        Input('dropdown2','value'),
+        State('team-store','data')
+    )
+else:
+    # the figures of the default teams are in the layout, a change of team
+    # only patches the line, its color and the logo
+    # callback for 1st dropdown, 2 outputs
+    @app.callback(
+        Output('time-series1','figure'),
+        Output('time-series3', 'figure'),
+        Input('dropdown1','value'),
+        prevent_initial_call=True
+    )
+    def update_graph(team1):
+        if team1 is None:
+            return no_update, no_update
+        return team_patches(team1, data_version())
+
+    # callback for 2nd dropdown, 2 outputs
+    @app.callback(
+        Output('time-series2','figure'),
+        Output('time-series4', 'figure'),
+        Input('dropdown2','value'),
+        prevent_initial_call=True
+    )
+    def update_graph(team2):
+        if team2 is None:
+            return no_update, no_update
+        return team_patches(team2, data_version())
 
+# callback for the multi team comparison, the default teams are in the layout
+@app.callback(
+    Output('multi-poc','figure'),
+    Output('multi-views', 'figure'),
+    Input('team-multi','value'),
+    prevent_initial_call=True
+)
+def compare_teams(teams):
+    return multi_team_figures(tuple(teams or ()), data_version())
+
+if __name__ == '__main__':
+    # the caches fill in the background while the server starts, the debug
+    # reloader serves from a child process so only that one warms up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup(warmup_tasks())
+    app.run_server(debug=True)
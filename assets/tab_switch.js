@@ -0,0 +1,10 @@
+// Shows the selected tab when every tab is preloaded into the page
+// (see build_tab in app.py), used when SEC_PRELOAD_TABS=1
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.sec = Object.assign({}, window.dash_clientside.sec, {
+    show_tab: function(tab) {
+        return ['tab-1', 'tab-2', 'tab-3'].map(function(id) {
+            return {display: id === tab ? 'block' : 'none'};
+        });
+    }
+});
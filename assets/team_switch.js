@@ -0,0 +1,25 @@
+// Draws the tab 2 team figures in the browser from the team store
+// (see team_store in app.py), used when SEC_CLIENTSIDE_TEAMS=1
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.sec = Object.assign({}, window.dash_clientside.sec, {
+    team_figures: function(team, store) {
+        var no_update = window.dash_clientside.no_update;
+        // team keys start at 0, only a cleared dropdown (null) is skipped
+        if (team === null || team === undefined || !store || !store.teams[team]) {
+            return [no_update, no_update];
+        }
+        var series = store.teams[team];
+
+        // copy the base figures so the store is never changed
+        var swap = function(base, x, y) {
+            var fig = JSON.parse(JSON.stringify(base));
+            fig.data[0].x = x;
+            fig.data[0].y = y;
+            fig.data[0].line = Object.assign({}, fig.data[0].line, {color: series.color});
+            fig.layout.images[0].source = series.logo;
+            return fig;
+        };
+        return [swap(store.base[0], series.poc_x, series.poc_y),
+                swap(store.base[1], series.views_x, series.views_y)];
+    }
+});
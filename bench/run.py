@@ -0,0 +1,162 @@
+# Benchmarks of the dashboard as the data grows
+# For every scale synthetic data is generated (see synth.py) and a fresh
+# Python process measures, with the data directory as working directory:
+#   load_merge_s     csv read, merges and the team summary, step by step
+#   cold_start_s     importing app.py with no snapshot on disk
+#   warm_start_s     importing app.py again with the snapshot in place
+#   update_graph     latency of the first (uncached) and repeated calls per team,
+#                    and the size of the json sent back
+#   render_content   the same for every tab
+#   peak_rss_mb      peak resident memory of the process
+# Results are written as json so builds can be compared.
+#   python bench/run.py --scales 1 10 100 --out bench_results.json
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds taken by fn(), and its result
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024*1024 if sys.platform == 'darwin' else 1024)
+
+def _summary(cold, warm, payload):
+    return {'cold_ms': 1000*statistics.median(cold),
+            'warm_ms': 1000*statistics.median(warm),
+            'payload_bytes': int(statistics.median(payload))}
+
+############## MEASUREMENTS, run in a fresh process inside the data directory ######################################
+def measure_pipeline():
+    import data
+    read_s, sources = timed(data.read_sources)
+    merge_s, MERGED = timed(data.build_merged, *sources)
+    summary_s, df = timed(data.team_summary, MERGED)
+    # games_read is what is left of the games file after dropping the unrated games
+    return {'games_read': len(sources[0]), 'merged': len(MERGED),
+            'load_merge_s': {'read_csv': read_s, 'merge_clean': merge_s, 'team_summary': summary_s,
+                             'total': read_s + merge_s + summary_s}}
+
+def measure_start():
+    return timed(__import__, 'app')[0]
+
+def measure_callbacks(repeats):
+    import app
+    from plotly.io.json import to_json_plotly
+    results = {}
+
+    # update_graph, the team series cache is cleared before each cold call
+    cold, warm, payload = [], [], []
+    for option in app.team_names_dict:
+        app.team_series.cache_clear()
+        seconds, figures = timed(app.update_graph, option['value'])
+        cold.append(seconds)
+        payload.append(len(to_json_plotly(figures)))
+        warm.extend(timed(app.update_graph, option['value'])[0] for i in range(repeats))
+    results['update_graph'] = _summary(cold, warm, payload)
+
+    # render_content, every built figure and tab layout is dropped before each cold call
+    results['render_content'] = {}
+    for tab, label in app.TABS:
+        cold, warm, payload = [], [], []
+        for i in range(repeats):
+            app.set_data(app.MERGED, app.df)
+            app.tab_layout.cache_clear()
+            app.team_store.cache_clear()
+            seconds, layout = timed(app.render_content, tab)
+            cold.append(seconds)
+            payload.append(len(to_json_plotly(layout)))
+            warm.append(timed(app.render_content, tab)[0])
+        results['render_content'][tab] = _summary(cold, warm, payload)
+    return results
+
+# Entry point of the measuring process, prints its results as json
+def worker(directory, phase, repeats):
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(directory)
+    # the app must use the server side callbacks that are being measured
+    os.environ['SEC_CLIENTSIDE_TEAMS'] = '0'
+    os.environ['SEC_PRELOAD_TABS'] = '0'
+    if phase == 'pipeline':
+        result = measure_pipeline()
+    else:
+        result = {'start_s': measure_start()}
+        if phase == 'warm':
+            result['callbacks'] = measure_callbacks(repeats)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    print(json.dumps(result))
+
+def _run_worker(directory, phase, repeats):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', directory, phase,
+                          '--repeats', str(repeats)],
+                         check=True, stdout=subprocess.PIPE, universal_newlines=True,
+                         env=dict(os.environ, SEC_SNAPSHOT_DIR=os.path.join(directory, '.cache')))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+############## DRIVER #############################################################################################
+def run_scale(scale, repeats):
+    from synth import generate
+    directory = tempfile.mkdtemp(prefix='sec-bench-%dx-' % scale)
+    try:
+        generated = generate(scale, directory)
+        pipeline = _run_worker(directory, 'pipeline', repeats)
+        cold = _run_worker(directory, 'cold', repeats)
+        warm = _run_worker(directory, 'warm', repeats)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'scale': scale,
+            'rows': dict(generated, games_read=pipeline['games_read'], merged=pipeline['merged']),
+            'load_merge_s': pipeline['load_merge_s'],
+            'cold_start_s': cold['start_s'],
+            'warm_start_s': warm['start_s'],
+            'callbacks': warm['callbacks'],
+            'peak_rss_mb': {'pipeline': pipeline['peak_rss_mb'], 'cold_start': cold['peak_rss_mb'],
+                            'warm_start': warm['peak_rss_mb']}}
+
+# git commit being measured, None outside a checkout
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard on synthetic data')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeats', type=int, default=5, help='calls per measurement')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--worker', nargs=2, metavar=('DIRECTORY', 'PHASE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.repeats)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    results = {'commit': _commit(), 'python': sys.version.split()[0],
+               'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scales': []}
+    for scale in args.scales:
+        print('Running %dx...' % scale, file=sys.stderr)
+        results['scales'].append(run_scale(scale, args.repeats))
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Wrote %s' % args.out, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Synthetic data with the same schema as the source csvs, for scaling tests
+# Scale k writes k copies of the real games and ratings. Copy r is moved r
+# seasons later (so 100x ends in 2117, well within the dates pandas can
+# represent), its game keys get an 'r:' prefix, its non-SEC teams are renamed
+# to new teams (with their stadiums added to the capacity file) and its
+# networks are renamed to one of a few new networks, so seasons, teams and
+# networks all grow with k.
+#   python bench/synth.py 10 /tmp/sec-10x
+
+import os
+import sys
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The SEC teams as they are written in the source files
+SEC_NAMES = {'Alabama','Arkansas','Auburn','Florida','Georgia','Kentucky','LSU','Mississippi (Ole Miss)',
+             'Mississippi State','Missouri','South Carolina','Tennessee','Texas A&M','Vanderbilt'}
+
+# copies cycle through this many renamed networks
+NETWORK_VARIANTS = 5
+
+def _read(name):
+    # read everything as text so the copies are written back exactly as read
+    return pd.read_csv(os.path.join(REPO_DIR, name), dtype=str, keep_default_na=False)
+
+# 'm/d/yyyy' moved by years
+def _shift_date(dates, years):
+    parts = dates.str.rsplit('/', n=1, expand=True)
+    return parts[0] + '/' + (parts[1].astype(int) + years).astype(str)
+
+# game keys of a copy, the real ones for copy 0
+def _copy_key(keys, copy):
+    return keys if copy == 0 else '%d:' % copy + keys
+
+def _rename_team(name, copy):
+    return name if name in SEC_NAMES or copy == 0 else '%s #%d' % (name, copy)
+
+def _rename_matchup(matchup, copy):
+    return ' vs '.join(_rename_team(side, copy) for side in matchup.split(' vs '))
+
+# One copy of the source tables
+def _copy(GAMES, RATINGS, CAPACITY, copy):
+    GAMES = GAMES.copy()
+    RATINGS = RATINGS.copy()
+    GAMES['date'] = _shift_date(GAMES['date'], copy)
+    GAMES['TeamIDsDate'] = _copy_key(GAMES['TeamIDsDate'], copy)
+    for column in ['homename', 'visname']:
+        GAMES[column] = GAMES[column].map(lambda name: _rename_team(name, copy))
+    GAMES['Matchup_Full_TeamNames'] = GAMES['Matchup_Full_TeamNames'].map(lambda m: _rename_matchup(m, copy))
+    RATINGS['Date'] = _shift_date(RATINGS['Date'], copy)
+    RATINGS['TeamIDsDate'] = _copy_key(RATINGS['TeamIDsDate'], copy)
+    if copy:
+        RATINGS['Network'] = RATINGS['Network'] + ' %d' % (copy % NETWORK_VARIANTS)
+    CAPACITY = CAPACITY.copy()
+    CAPACITY['homename'] = CAPACITY['homename'].map(lambda name: _rename_team(name, copy))
+    return GAMES, RATINGS, CAPACITY
+
+# Write games, ratings and capacity csvs at scale k into directory
+# the logos are linked in so the app can run from that directory
+# returns the rows written to each file
+def generate(scale, directory):
+    os.makedirs(directory, exist_ok=True)
+    GAMES, RATINGS, CAPACITY = _read('games_flat_xml_2012-2018.csv'), _read('TV_Ratings_onesheet.csv'), _read('capacity.csv')
+    copies = [_copy(GAMES, RATINGS, CAPACITY, copy) for copy in range(scale)]
+    GAMES = pd.concat([c[0] for c in copies])
+    RATINGS = pd.concat([c[1] for c in copies])
+    CAPACITY = pd.concat([c[2] for c in copies]).drop_duplicates()
+    GAMES.to_csv(os.path.join(directory, 'games_flat_xml_2012-2018.csv'), index=False)
+    RATINGS.to_csv(os.path.join(directory, 'TV_Ratings_onesheet.csv'), index=False)
+    CAPACITY.to_csv(os.path.join(directory, 'capacity.csv'), index=False)
+    logos = os.path.join(directory, 'logos')
+    if not os.path.exists(logos):
+        os.symlink(os.path.join(REPO_DIR, 'logos'), logos)
+    return {'games': len(GAMES), 'ratings': len(RATINGS), 'capacity': len(CAPACITY)}
+
+
+if __name__ == '__main__':
+    generate(int(sys.argv[1]), sys.argv[2])
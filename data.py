@@ -0,0 +1,441 @@
+# Data loading, cleaning and on-disk snapshot for the dashboard
+# The fully engineered MERGED table and the aggregate cube are cached as a
+# columnar (parquet) snapshot keyed by a fingerprint of the source csvs and the
+# cleaning code version, so restarts skip the csv parse and merges.
+# Build the snapshot ahead of time with:  python data.py
+# Add a new batch of games with:  python data.py --ingest GAMES_CSV RATINGS_CSV
+
+import hashlib
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from metrics import phase
+
+############## SOURCE FILES AND SETTINGS ##########################################################################
+RATINGS_CSV = 'TV_Ratings_onesheet.csv'
+GAMES_CSV = 'games_flat_xml_2012-2018.csv'
+CAPACITY_CSV = 'capacity.csv'
+SOURCE_FILES = [RATINGS_CSV, GAMES_CSV, CAPACITY_CSV]
+
+# Bump this whenever the cleaning/engineering code below changes,
+# otherwise old snapshots would still be considered valid
+CLEANING_VERSION = 6
+
+# where snapshots are written, can be overridden for deployments
+SNAPSHOT_DIR = os.environ.get('SEC_SNAPSHOT_DIR', '.cache')
+
+# where the app's data comes from: 'pandas' (MERGED and the cube in memory,
+# cached as a parquet snapshot) or 'sqlite' (queries on a database file, see database.py)
+BACKEND = os.environ.get('SEC_BACKEND', 'pandas')
+
+# Team dimension of the SEC teams, a team's position in TEAMS is its integer key
+# ids and names are every way the source files (and older dropdown values)
+# write the team, they are matched exactly so Georgia Tech is not Georgia
+TEAMS = [
+    {'name':'Alabama', 'ids':['UA'], 'names':[], 'logo':'UA.png', 'color':'rgb(158,27,50)'},
+    {'name':'Arkansas', 'ids':['AR'], 'names':[], 'logo':'UAK.png', 'color':'rgb(157,34,53)'},
+    {'name':'Auburn', 'ids':['AU'], 'names':[], 'logo':'AU.png', 'color':'rgb(232,119,34)'},
+    {'name':'Florida', 'ids':['UF'], 'names':[], 'logo':'UF.png', 'color':'rgb(0,33,165)'},
+    {'name':'Mississippi State', 'ids':['MS'], 'names':[], 'logo':'MSU.png', 'color':'rgb(93,23,37)'},
+    {'name':'Kentucky', 'ids':['UK'], 'names':[], 'logo':'UK.png', 'color':'rgb(0,51,160)'},
+    {'name':'South Carolina', 'ids':['SCAR'], 'names':[], 'logo':'USC.png', 'color':'rgb(155,0,10)'},
+    {'name':'Ole Miss', 'ids':['OM'], 'names':['Mississippi (Ole Miss)', '(Ole Miss)'], 'logo':'OM.png',
+     'color':'rgb(204,9,47)'},
+    {'name':'Georgia', 'ids':['UGA'], 'names':[], 'logo':'UGA.png', 'color':'rgb(186,12,47)'},
+    {'name':'Tennessee', 'ids':['TENN'], 'names':[], 'logo':'UT.png', 'color':'rgb(255,130,0)'},
+    {'name':'Texas A&M', 'ids':['TAMU'], 'names':[], 'logo':'TAM.png', 'color':'rgb(80,0,0)'},
+    {'name':'LSU', 'ids':['LSU'], 'names':[], 'logo':'LSU.png', 'color':'rgb(70,29,124)'},
+    {'name':'Vanderbilt', 'ids':['VANDY'], 'names':[], 'logo':'VU.png', 'color':'rgb(134,109,75)'},
+    {'name':'Missouri', 'ids':['MIZZU'], 'names':[], 'logo':'MU.png', 'color':'rgb(0,0,0)'},
+]
+
+# List of SEC teams, indexed by team key
+SEC_teams = [team['name'] for team in TEAMS]
+
+# every id and name variant to its team key
+TEAM_KEYS = {variant: key for key, team in enumerate(TEAMS)
+             for variant in [team['name']] + team['ids'] + team['names']}
+
+# color and logo of every team, indexed by team key
+TEAM_COLORS = np.array([team['color'] for team in TEAMS], dtype=object)
+TEAM_LOGOS = np.array(['logos/' + team['logo'] for team in TEAMS], dtype=object)
+
+
+# Columns the dashboard uses from each source file and the dtype they are read as
+# everything else in the files (officials, weather, box scores...) is never read
+GAMES_SCHEMA = {'TeamIDsDate':'object', 'homename':'object', 'visname':'object', 'stadium':'object',
+                'date':'object', 'attend':'float32', 'rank_home':'object', 'rank_vis':'object',
+                'Matchup_Full_TeamNames':'object', 'postseason':'object', 'homeid':'object', 'visid':'object'}
+# viewers are N/A for some games, so they cannot be an integer column
+RATINGS_SCHEMA = {'TeamIDsDate':'object', 'RATING':'float32', 'VIEWERS':'float64', 'Network':'object'}
+CAPACITY_SCHEMA = {'homename':'object', 'stadium':'object', 'Capacity':'int32'}
+
+# rows per chunk when streaming the games file
+CSV_CHUNK_ROWS = int(os.environ.get('SEC_CSV_CHUNK_ROWS', 100000))
+
+# the games file writes dates as 1/7/2019
+DATE_FORMAT = '%m/%d/%Y'
+
+# strings with few distinct values, stored as categoricals after the merges
+CATEGORY_COLUMNS = ['homename', 'visname', 'stadium', 'Matchup_Full_TeamNames', 'Network', 'homeid', 'visid']
+
+# what the aggregate cube is keyed by and the measures it sums and counts
+# percent of capacity is kept as well, its charts are a mean of per game ratios
+CUBE_LEVELS = ['team', 'season', 'home', 'postseason', 'network']
+CUBE_MEASURES = ['VIEWERS', 'RATING', 'attend', 'Capacity', 'Percent_of_Capacity']
+
+
+############## READ IN DATA #######################################################################################
+def read_csv(path, schema):
+    return pd.read_csv(path, usecols=list(schema), dtype=schema)
+
+# Stream a csv in chunks, keeping only the rows whose key is one of keys
+# peak memory is one chunk plus the rows kept, not the whole file
+def read_csv_semijoin(path, schema, key, keys):
+    keys = pd.Index(pd.unique(keys))
+    chunks = [chunk[chunk[key].isin(keys)]
+              for chunk in pd.read_csv(path, usecols=list(schema), dtype=schema, chunksize=CSV_CHUNK_ROWS)]
+    if not chunks:
+        return pd.read_csv(path, usecols=list(schema), dtype=schema, nrows=0)
+    return pd.concat(chunks, ignore_index=True)
+
+def read_sources():
+    with phase('read_csv'):
+        RATINGS = read_csv(RATINGS_CSV, RATINGS_SCHEMA)
+        # the inner merge drops every game without a TV rating, so those
+        # are dropped while streaming the (much larger) games file instead
+        GAMES = read_csv_semijoin(GAMES_CSV, GAMES_SCHEMA, 'TeamIDsDate', RATINGS['TeamIDsDate'])
+        CAPACITY = read_csv(CAPACITY_CSV, CAPACITY_SCHEMA)
+    return GAMES, RATINGS, CAPACITY
+
+# Turn the string columns with few values back into categoricals
+# (merges and concats of categoricals with different categories give objects)
+def compact_dtypes(MERGED):
+    for column in CATEGORY_COLUMNS:
+        MERGED[column] = MERGED[column].astype('category')
+    return MERGED
+
+# Memory used by MERGED, in total and for its largest columns
+def memory_report(MERGED, top=8):
+    usage = MERGED.memory_usage(index=True, deep=True).sort_values(ascending=False)
+    lines = ['MERGED: %d rows x %d columns, %.2f MB' % (len(MERGED), MERGED.shape[1], usage.sum()/1e6)]
+    for column, size in usage.head(top).items():
+        dtype = MERGED[column].dtype if column in MERGED else 'index'
+        lines.append('  %-28s %-10s %8.1f KB' % (column, dtype, size/1e3))
+    return '\n'.join(lines)
+
+
+################# DATA ENGINEERING/CLEANING ##############################################
+# Merge and clean the 3 datasets into the MERGED table
+def build_merged(GAMES, RATINGS, CAPACITY):
+    with phase('merge'):
+        # only the columns in the schemas, batches may come with every column
+        GAMES = GAMES[list(GAMES_SCHEMA)].copy()
+        RATINGS = RATINGS[list(RATINGS_SCHEMA)]
+        CAPACITY = CAPACITY[list(CAPACITY_SCHEMA)]
+
+        # this attendance value is a typo. 710,004 should be 71,004
+        GAMES.loc[GAMES['attend'] > 200000,'attend'] = 71004
+
+        # merge the 3 datasets
+        MERGED = pd.merge(GAMES,RATINGS,how='inner',on='TeamIDsDate')
+        # capacity is a custom dataset
+        MERGED = pd.merge(MERGED,CAPACITY,on=['homename','stadium'])
+
+    with phase('feature_engineering'):
+        # a KPI we will use is perecent of capacity
+        MERGED['Percent_of_Capacity'] = (MERGED['attend']/MERGED['Capacity']).astype(np.float32)
+
+        # turn the date column into an actual date
+        MERGED['date'] = pd.to_datetime(MERGED['date'], format=DATE_FORMAT)
+
+        # bowl and playoff games are marked Y, every other game character(0)
+        MERGED['postseason'] = MERGED['postseason'].eq('Y')
+        MERGED = compact_dtypes(MERGED)
+
+        # team keys of the home and visiting teams, -1 outside the SEC
+        # from the team ids, or the names where a batch has an unknown id
+        for side, name in [('home', 'homename'), ('vis', 'visname')]:
+            keys = team_keys(MERGED[side + 'id'])
+            MERGED[side + '_key'] = np.where(keys >= 0, keys, team_keys(MERGED[name]))
+
+        # One hot-encode SEC teams
+        # A uint8 column for every team
+        # 1 if that team was in the game (home or away) 0 otherwise
+        onehot = pd.DataFrame(team_onehot(MERGED['home_key'].values, MERGED['vis_key'].values),
+                              columns=SEC_teams, index=MERGED.index)
+        MERGED = pd.concat([MERGED, onehot], axis=1)
+
+        # Engineer new variable: summed ranks of teams playing
+        # teams outside the top 25 have no rank, call them 26
+        # ranks and their sum are at most 52, they fit in a byte
+        MERGED['rank_home'] = MERGED['rank_home'].replace({'character(0)':'26'})
+        MERGED['rank_home'] = MERGED['rank_home'].astype(np.uint8)
+        MERGED['rank_vis'] = MERGED['rank_vis'].replace({'character(0)':'26'})
+        MERGED['rank_vis'] = MERGED['rank_vis'].astype(np.uint8)
+        MERGED['added_rank'] = MERGED['rank_home'] + MERGED['rank_vis']
+    return MERGED
+
+# Team key of every team id or name in values, -1 for teams outside the SEC
+# each distinct value is looked up once and rows just index into the result
+def team_keys(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.values, values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    # missing values have code -1, which picks this last -1
+    lookup = np.array([TEAM_KEYS.get(value, -1) for value in uniques] + [-1], dtype=np.int8)
+    return lookup[codes]
+
+# One hot matrix (games x SEC teams) of the teams playing in each game
+def team_onehot(home_keys, vis_keys):
+    # key -1 sets the extra last column, which is dropped
+    onehot = np.zeros((len(home_keys), len(TEAMS) + 1), dtype=np.uint8)
+    rows = np.arange(len(home_keys))
+    onehot[rows, home_keys] = 1
+    onehot[rows, vis_keys] = 1
+    return onehot[:, :-1]
+
+# Sums and counts of the measures for every (team, season, home, postseason, network) cell
+# One row per cell with a '<measure>_sum' and '<measure>_n' column per measure
+# and 'games', the number of games in the cell. Every mean the charts show is
+# a sum over some cells divided by a count over the same cells, so it is
+# answered from the cube instead of rescanning MERGED. Cubes of two batches
+# of games add up to the cube of both.
+def build_cube(MERGED):
+    # one row per (game, SEC team that played in it), home teams then visitors
+    home_keys, vis_keys = MERGED['home_key'].values, MERGED['vis_key'].values
+    rows = np.concatenate([np.flatnonzero(home_keys >= 0), np.flatnonzero(vis_keys >= 0)])
+    hosted = np.arange(len(rows)) < (home_keys >= 0).sum()
+    long = pd.DataFrame({
+        'team':np.where(hosted, home_keys[rows], vis_keys[rows]).astype(np.int64),
+        # the year of the game date, like the yearly charts
+        'season':MERGED['date'].dt.year.values[rows],
+        'home':hosted,
+        'postseason':MERGED['postseason'].values[rows],
+        'network':np.asarray(MERGED['Network'].astype(object))[rows]
+    })
+    aggregations = {'games':('home','size')}
+    for measure in CUBE_MEASURES:
+        long[measure] = MERGED[measure].values[rows].astype(np.float64)
+        aggregations[measure + '_sum'] = (measure, 'sum')
+        aggregations[measure + '_n'] = (measure, 'count')
+    return long.groupby(CUBE_LEVELS, dropna=False).agg(**aggregations)
+
+# Mean of a measure over the cube cells matching filters, grouped by the levels in by
+# a filter is a level name and either one value or a list of values to keep,
+# e.g. cube_mean(cube, 'VIEWERS', 'season', team=TEAM_KEYS['Alabama'], home=True)
+# mask, e.g. from cube_filter, keeps only the cells where it is True
+def cube_mean(cube, measure, by, mask=None, **filters):
+    cells = cube[[measure + '_sum', measure + '_n']]
+    if mask is not None:
+        cells = cells[mask]
+    for level, value in filters.items():
+        values = cells.index.get_level_values(level)
+        keep = values.isin(value) if isinstance(value, (list, tuple, set, frozenset)) else values == value
+        cells = cells[keep]
+    sums = cells.groupby(level=by).sum()
+    return sums[measure + '_sum']/sums[measure + '_n']
+
+# Per-team averages from the cube, every team sorted by name
+# attendance only counts for the team's home games
+# with a mask only the cells it keeps are averaged, teams without any are NaN
+def team_summary_from_cube(cube, mask=None):
+    keys = pd.Index(sorted(range(len(TEAMS)), key=lambda key: SEC_teams[key]), name='TeamKey')
+    df = pd.DataFrame({
+        'Team':np.array(SEC_teams, dtype=object)[keys],
+        'AvgViews':cube_mean(cube, 'VIEWERS', 'team', mask).reindex(keys),
+        'Avgattend':cube_mean(cube, 'Percent_of_Capacity', 'team', mask, home=True).reindex(keys),
+        'AvgRating':cube_mean(cube, 'RATING', 'team', mask).reindex(keys)
+    }, index=keys).reset_index()
+    return df
+
+# Boolean masks over the cube cells for every value of the filterable levels
+# built once per cube, {level: {value: mask}}
+def build_cube_masks(cube):
+    masks = {}
+    for level in ['season', 'home', 'postseason', 'network']:
+        # missing networks get code -1 and no mask
+        codes, uniques = pd.factorize(cube.index.get_level_values(level))
+        masks[level] = {value: codes == i for i, value in enumerate(uniques)}
+    masks['all'] = np.ones(len(cube), dtype=bool)
+    return masks
+
+# Mask of the cells matching filters, each filter is a level and the values to keep
+# the value masks of a level are ORed and the levels ANDed, None keeps every cell
+# e.g. cube_filter(masks, season=range(2014, 2017), network=['CBS'], home=None)
+def cube_filter(masks, **filters):
+    keep = masks['all'].copy()
+    for level, values in filters.items():
+        if values is None:
+            continue
+        selected = [masks[level][value] for value in values if value in masks[level]]
+        if selected:
+            keep &= np.logical_or.reduce(selected)
+        else:
+            keep[:] = False
+    return keep
+
+# get summary statistics for each team in one grouped pass
+def team_summary(MERGED):
+    return team_summary_from_cube(build_cube(MERGED))
+
+
+############## SNAPSHOT ###########################################################################################
+# Hash of the source files and the cleaning code version
+def fingerprint():
+    h = hashlib.sha256()
+    h.update(('cleaning-v%d' % CLEANING_VERSION).encode())
+    for path in SOURCE_FILES:
+        h.update(path.encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+def snapshot_paths(key):
+    return (os.path.join(SNAPSHOT_DIR, 'merged-%s.parquet' % key),
+            os.path.join(SNAPSHOT_DIR, 'cube-%s.parquet' % key))
+
+# Write a frame next to its final path and move it into place,
+# so a worker never reads a half written snapshot
+def _write_atomic(frame, path):
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    frame.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+# Write MERGED and the aggregate cube under a fingerprint
+def write_snapshot(key, MERGED, cube):
+    merged_path, cube_path = snapshot_paths(key)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        _write_atomic(MERGED, merged_path)
+        _write_atomic(cube.reset_index(), cube_path)
+    except (ImportError, OSError, ValueError) as e:
+        # no parquet engine or read-only disk, the app still works without a snapshot
+        print('Could not write data snapshot: %s' % e)
+
+# Read MERGED and the aggregate cube for a fingerprint, None when there is no usable snapshot
+def read_snapshot(key):
+    merged_path, cube_path = snapshot_paths(key)
+    if os.path.exists(merged_path) and os.path.exists(cube_path):
+        try:
+            return pd.read_parquet(merged_path), pd.read_parquet(cube_path).set_index(CUBE_LEVELS)
+        except (ImportError, OSError, ValueError) as e:
+            print('Could not read data snapshot, rebuilding: %s' % e)
+    return None
+
+# Run the full pipeline and write the snapshot, returns (MERGED, cube)
+def build_snapshot(key=None):
+    key = key or fingerprint()
+    MERGED = build_merged(*read_sources())
+    with phase('cube'):
+        cube = build_cube(MERGED)
+    with phase('snapshot_write'):
+        write_snapshot(key, MERGED, cube)
+    return MERGED, cube
+
+# Remove the memory-mapped column directories of other fingerprints
+# workers still mapping them keep their pages until they exit
+def _prune_columns(keep):
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith('columns-') and name != keep:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, name), ignore_errors=True)
+
+def _map_columns(MERGED, directory):
+    columns = {}
+    for i, column in enumerate(MERGED.columns):
+        values = MERGED[column].values
+        if not isinstance(values, np.ndarray) or values.dtype.kind not in 'biuf':
+            columns[column] = values
+            continue
+        path = os.path.join(directory, '%d.npy' % i)
+        if not os.path.exists(path):
+            tmp = '%s.%d.tmp.npy' % (path[:-4], os.getpid())
+            np.save(tmp, values)
+            os.replace(tmp, path)
+        columns[column] = np.load(path, mmap_mode='r')
+    # copy=False keeps each mapped array as its own block instead of consolidating
+    return pd.DataFrame(columns, index=MERGED.index, copy=False)
+
+# Move the numeric columns of MERGED into memory-mapped .npy files
+# Workers forked from one process (or started on the same host) then share
+# those pages through the OS page cache instead of each holding a copy
+def map_numeric_columns(MERGED, key):
+    name = 'columns-%s' % key
+    directory = os.path.join(SNAPSHOT_DIR, name)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            _prune_columns(name)
+        return _map_columns(MERGED, directory)
+    except OSError as e:
+        # read-only disk, the columns stay in memory
+        print('Could not memory-map the data columns: %s' % e)
+        return MERGED
+
+# Load MERGED and the aggregate cube, from the snapshot when its fingerprint matches
+# with mmap the numeric columns are served from memory-mapped files
+def load_data(mmap=False):
+    key = fingerprint()
+    with phase('snapshot_read'):
+        snapshot = read_snapshot(key)
+    MERGED, cube = snapshot or build_snapshot(key)
+    if mmap:
+        with phase('mmap_columns'):
+            MERGED = map_numeric_columns(MERGED, key)
+    return MERGED, cube
+
+
+############## INCREMENTAL INGEST ##################################################################################
+# Add a batch of new games and their ratings to MERGED without a full rebuild
+# Only the new rows are merged and cleaned, the cube is updated by adding
+# the batch's sums and counts. Games already in MERGED are skipped.
+# Returns (MERGED, cube, NEW) where NEW holds the rows that were added
+def ingest(MERGED, cube, GAMES, RATINGS, CAPACITY):
+    NEW = build_merged(GAMES.copy(), RATINGS, CAPACITY)
+    NEW = NEW[~NEW['TeamIDsDate'].isin(MERGED['TeamIDsDate'])]
+    MERGED = compact_dtypes(pd.concat([MERGED, NEW], ignore_index=True))
+    cube = cube.add(build_cube(NEW), fill_value=0)
+    return MERGED, cube, NEW
+
+# Append a batch to a source csv in that file's column order
+def _append_csv(batch, path):
+    columns = pd.read_csv(path, nrows=0).columns
+    batch.reindex(columns=columns).to_csv(path, mode='a', header=False, index=False)
+
+# A batch csv as text, every column, so its rows are appended exactly as written
+def _read_raw(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+# Weekly update: ingest a games csv and a ratings csv with the same schema
+# as the source files, append the rows of the games that were added to the
+# sources so they stay the full record (a rebuild from them gives the same
+# MERGED and cube), and write the snapshot for the new fingerprint
+def ingest_files(games_csv, ratings_csv):
+    key = fingerprint()
+    MERGED, cube = read_snapshot(key) or build_snapshot(key)
+    GAMES = read_csv(games_csv, GAMES_SCHEMA)
+    RATINGS = read_csv(ratings_csv, RATINGS_SCHEMA)
+    MERGED, cube, NEW = ingest(MERGED, cube, GAMES, RATINGS, read_csv(CAPACITY_CSV, CAPACITY_SCHEMA))
+    # games already in MERGED and games without a rating are left out of the sources
+    added = NEW['TeamIDsDate'].unique()
+    for batch_csv, source_csv in [(games_csv, GAMES_CSV), (ratings_csv, RATINGS_CSV)]:
+        batch = _read_raw(batch_csv)
+        _append_csv(batch[batch['TeamIDsDate'].isin(added)], source_csv)
+    write_snapshot(fingerprint(), MERGED, cube)
+    return MERGED, cube, NEW
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Build the data snapshot or ingest a new batch of games')
+    parser.add_argument('--ingest', nargs=2, metavar=('GAMES_CSV', 'RATINGS_CSV'),
+                        help='add new games and ratings to the sources and the snapshot')
+    args = parser.parse_args()
+    if args.ingest:
+        MERGED, cube, NEW = ingest_files(*args.ingest)
+        print('Ingested %d games, snapshot %s (%d games)' % (len(NEW), fingerprint(), len(MERGED)))
+    else:
+        MERGED, cube = build_snapshot()
+        print('Wrote snapshot %s (%d games)' % (fingerprint(), len(MERGED)))
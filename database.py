@@ -0,0 +1,241 @@
+# SQLite backend for the dashboard data, used with SEC_BACKEND=sqlite
+# The three csvs are loaded into one database file next to the snapshots and
+# the merges and cleaning are done there once in SQL. Workers then hold no
+# MERGED and no cube: they open the file read-only and share its pages
+# through the OS page cache.
+#   - the per-team yearly series of tab 2 and the per-team averages of tab 1
+#     (for any choice of its filters) are indexed queries over team_games
+#   - the tab 3 figures read only the columns they plot, when they are built
+# The file records the size and modification time of the sources it was
+# built from, so a worker only stats the csvs to know it is current.
+# Build the database ahead of time with:  python database.py
+
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from metrics import phase
+from data import (RATINGS_CSV, GAMES_CSV, CAPACITY_CSV, RATINGS_SCHEMA, GAMES_SCHEMA, CAPACITY_SCHEMA,
+                  SOURCE_FILES, CLEANING_VERSION, SNAPSHOT_DIR, TEAMS, SEC_teams, TEAM_KEYS,
+                  read_csv, read_csv_semijoin)
+
+DATABASE_PATH = os.path.join(SNAPSHOT_DIR, 'sec.sqlite')
+
+# columns of the merged table, MERGED's columns without the one hot team columns
+MERGED_COLUMNS = (list(GAMES_SCHEMA) + [column for column in RATINGS_SCHEMA if column != 'TeamIDsDate']
+                  + ['Capacity', 'Percent_of_Capacity', 'home_key', 'vis_key', 'added_rank', 'season'])
+
+# The same cleaning as build_merged, dates are m/d/yyyy strings in the games file
+MERGE_SQL = """
+CREATE TABLE merged AS
+WITH dated AS (
+    SELECT rowid AS game_row, *,
+           CASE WHEN attend > 200000 THEN 71004 ELSE attend END AS attend_fixed,
+           substr(date, instr(date, '/') + 1) AS day_year
+    FROM games
+), parsed AS (
+    SELECT *,
+           CAST(substr(date, 1, instr(date, '/') - 1) AS INTEGER) AS month,
+           CAST(substr(day_year, 1, instr(day_year, '/') - 1) AS INTEGER) AS day,
+           CAST(substr(day_year, instr(day_year, '/') + 1) AS INTEGER) AS season,
+           CASE WHEN rank_home = 'character(0)' THEN 26 ELSE CAST(rank_home AS INTEGER) END AS rank_home_n,
+           CASE WHEN rank_vis = 'character(0)' THEN 26 ELSE CAST(rank_vis AS INTEGER) END AS rank_vis_n
+    FROM dated
+)
+SELECT g.TeamIDsDate, g.homename, g.visname, g.stadium,
+       printf('%04d-%02d-%02d', g.season, g.month, g.day) AS date,
+       g.attend_fixed AS attend, g.rank_home_n AS rank_home, g.rank_vis_n AS rank_vis,
+       g.Matchup_Full_TeamNames, g.postseason = 'Y' AS postseason, g.homeid, g.visid,
+       r.RATING, r.VIEWERS, r.Network, c.Capacity,
+       g.attend_fixed * 1.0 / c.Capacity AS Percent_of_Capacity,
+       COALESCE((SELECT team_key FROM team_names WHERE variant = g.homeid),
+                (SELECT team_key FROM team_names WHERE variant = g.homename), -1) AS home_key,
+       COALESCE((SELECT team_key FROM team_names WHERE variant = g.visid),
+                (SELECT team_key FROM team_names WHERE variant = g.visname), -1) AS vis_key,
+       g.rank_home_n + g.rank_vis_n AS added_rank,
+       g.season
+FROM parsed g
+JOIN ratings r ON r.TeamIDsDate = g.TeamIDsDate
+JOIN capacity c ON c.homename = g.homename AND c.stadium = g.stadium
+ORDER BY g.game_row, r.rowid
+"""
+
+# Every (game, SEC team that played in it) by team key, home when the team hosted
+TEAM_GAMES_SQL = """
+CREATE TABLE team_games AS
+SELECT rowid AS game, home_key AS team, 1 AS home, season FROM merged WHERE home_key >= 0
+UNION ALL
+SELECT rowid AS game, vis_key AS team, 0 AS home, season FROM merged WHERE vis_key >= 0
+"""
+
+# the joins of MERGE_SQL look the ratings and stadiums up by these
+SOURCE_INDEX_SQL = ["CREATE INDEX ratings_teamidsdate ON ratings (TeamIDsDate)",
+                    "CREATE INDEX capacity_stadium ON capacity (homename, stadium)"]
+
+# team_games_team drives the per-team queries, the tab 1 season and network
+# filters and the season and network lists go through merged's indexes
+INDEX_SQL = ["CREATE INDEX merged_season ON merged (season)",
+             "CREATE INDEX merged_network ON merged (Network)",
+             "CREATE INDEX team_games_team ON team_games (team, home, season)",
+             "CREATE INDEX team_games_game ON team_games (game)"]
+
+# What the database was built from: the cleaning version and every source's
+# size and modification time, stat-ed instead of hashed so checking is instant
+def source_stamp():
+    files = []
+    for path in SOURCE_FILES:
+        stat = os.stat(path)
+        files.append([path, stat.st_size, stat.st_mtime_ns])
+    return json.dumps({'cleaning': CLEANING_VERSION, 'files': files})
+
+# Load the csvs, merge, clean and index them, written next to
+# its final path and moved into place so a worker never opens a half built file
+def build_database(path=DATABASE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    stamp = source_stamp()
+    with phase('sqlite_build'):
+        con = sqlite3.connect(tmp)
+        try:
+            RATINGS = read_csv(RATINGS_CSV, RATINGS_SCHEMA)
+            read_csv_semijoin(GAMES_CSV, GAMES_SCHEMA, 'TeamIDsDate', RATINGS['TeamIDsDate']).to_sql('games', con, index=False)
+            RATINGS.to_sql('ratings', con, index=False)
+            read_csv(CAPACITY_CSV, CAPACITY_SCHEMA).to_sql('capacity', con, index=False)
+            for statement in SOURCE_INDEX_SQL:
+                con.execute(statement)
+            # the team dimension, every id and name variant to its team key
+            con.execute('CREATE TABLE teams (team_key INTEGER PRIMARY KEY, name TEXT)')
+            con.executemany('INSERT INTO teams VALUES (?, ?)', list(enumerate(SEC_teams)))
+            con.execute('CREATE TABLE team_names (variant TEXT PRIMARY KEY, team_key INTEGER REFERENCES teams)')
+            con.executemany('INSERT INTO team_names VALUES (?, ?)', list(TEAM_KEYS.items()))
+            con.execute(MERGE_SQL)
+            con.execute(TEAM_GAMES_SQL)
+            for statement in INDEX_SQL:
+                con.execute(statement)
+            con.execute('ANALYZE')
+            con.execute('CREATE TABLE meta (stamp TEXT)')
+            con.execute('INSERT INTO meta VALUES (?)', (stamp,))
+            con.commit()
+        finally:
+            con.close()
+    os.replace(tmp, path)
+    return path
+
+# Whether the database at path was built from the current sources
+def is_current(path=DATABASE_PATH):
+    if not os.path.exists(path):
+        return False
+    con = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+    try:
+        return con.execute('SELECT stamp FROM meta').fetchone()[0] == source_stamp()
+    except sqlite3.Error:
+        return False
+    finally:
+        con.close()
+
+############## READ-ONLY QUERIES ##################################################################################
+# one read-only connection per thread, opened again in forked workers
+_local = threading.local()
+
+def connection():
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.con = sqlite3.connect('file:%s?mode=ro' % DATABASE_PATH, uri=True)
+        _local.pid = os.getpid()
+    return _local.con
+
+def query(sql, params=()):
+    return pd.read_sql_query(sql, connection(), params=params)
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+# Average of a measure by season for one team, only its home games with home
+# the same series data.cube_mean gives for team=team (and home=True)
+def _team_season_mean(team, measure, home):
+    sql = ('SELECT t.season, AVG(m.%s) AS value FROM team_games t JOIN merged m ON m.rowid = t.game'
+           ' WHERE t.team = ?' % measure)
+    params = [int(team)]
+    if home:
+        sql += ' AND t.home = 1'
+    frame = query(sql + ' GROUP BY t.season ORDER BY t.season', params)
+    return frame.set_index('season')['value'].astype(np.float64).rename(None)
+
+# Average percent of capacity (home games) and viewers (all games) by year for one team
+def team_yearly(team):
+    return _team_season_mean(team, 'Percent_of_Capacity', True), _team_season_mean(team, 'VIEWERS', False)
+
+# The same for several teams, each series is indexed by (team, season)
+def teams_yearly(teams):
+    teams = [int(team) for team in teams]
+    series = []
+    for measure, home in [('Percent_of_Capacity', True), ('VIEWERS', False)]:
+        sql = ('SELECT t.team, t.season, AVG(m.%s) AS value FROM team_games t JOIN merged m ON m.rowid = t.game'
+               ' WHERE t.team IN (%s)' % (measure, _placeholders(teams)))
+        if home:
+            sql += ' AND t.home = 1'
+        frame = query(sql + ' GROUP BY t.team, t.season ORDER BY t.team, t.season', teams)
+        series.append(frame.set_index(['team', 'season'])['value'].astype(np.float64).rename(None))
+    return tuple(series)
+
+# Per-team averages, every team sorted by name, like data.team_summary_from_cube
+# each filter is the values to keep (as for data.cube_filter) or None for all
+# attendance only counts for the team's home games, teams without games are NaN
+def team_summary(season=None, network=None, home=None, postseason=None):
+    where, params = [], []
+    for column, values in [('m.season', season), ('m.Network', network),
+                           ('t.home', home), ('m.postseason', postseason)]:
+        if values is not None:
+            values = [int(value) if isinstance(value, (bool, np.bool_, np.integer)) else value for value in values]
+            where.append('%s IN (%s)' % (column, _placeholders(values)))
+            params.extend(values)
+    frame = query('SELECT t.team, AVG(m.VIEWERS) AS AvgViews,'
+                  ' AVG(CASE WHEN t.home = 1 THEN m.Percent_of_Capacity END) AS Avgattend,'
+                  ' AVG(m.RATING) AS AvgRating'
+                  ' FROM team_games t JOIN merged m ON m.rowid = t.game'
+                  + (' WHERE ' + ' AND '.join(where) if where else '') +
+                  ' GROUP BY t.team', params).set_index('team').astype(np.float64)
+    keys = pd.Index(sorted(range(len(TEAMS)), key=lambda key: SEC_teams[key]), name='TeamKey')
+    df = pd.DataFrame({
+        'Team':np.array(SEC_teams, dtype=object)[keys],
+        'AvgViews':frame['AvgViews'].reindex(keys),
+        'Avgattend':frame['Avgattend'].reindex(keys),
+        'AvgRating':frame['AvgRating'].reindex(keys)
+    }, index=keys).reset_index()
+    return df
+
+# Seasons and networks there are games for, for the tab 1 filters
+def seasons():
+    return query('SELECT DISTINCT season FROM merged ORDER BY season')['season'].tolist()
+
+def networks():
+    return query('SELECT DISTINCT Network FROM merged WHERE Network IS NOT NULL ORDER BY Network')['Network'].tolist()
+
+# The merged table, read a column at a time
+# figures.py's builders index it like MERGED (MERGED['VIEWERS'] or
+# MERGED[['Network', 'VIEWERS']]) and get only the columns they ask for
+class MergedTable:
+    def __getitem__(self, columns):
+        names = [columns] if isinstance(columns, str) else list(columns)
+        for name in names:
+            if name not in MERGED_COLUMNS:
+                raise KeyError(name)
+        frame = query('SELECT %s FROM merged ORDER BY rowid' % ', '.join('"%s"' % name for name in names))
+        return frame[columns]
+
+    def __len__(self):
+        return connection().execute('SELECT COUNT(*) FROM merged').fetchone()[0]
+
+# Make sure the database is built from the current sources and return the
+# merged table to hand to the figures
+def load_data():
+    with phase('sqlite_check'):
+        current = is_current()
+    if not current:
+        build_database()
+    return MergedTable()
+
+
+if __name__ == '__main__':
+    print('Wrote %s' % build_database())
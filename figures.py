@@ -0,0 +1,307 @@
+# Static figures for tab 1 and tab 3
+# Each figure is registered with a builder and only built the first time
+# render_content asks for it, after that the built figure is reused.
+# plotly is imported inside the builders so it is not paid for at startup.
+
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from logos import logo_url
+from metrics import phase
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Rendering mode for the tab 3 scatter figures
+# up to WEBGL_THRESHOLD points they are drawn as svg markers, above it with
+# WebGL, and above DENSITY_THRESHOLD they are binned on the server into a
+# DENSITY_BINS x DENSITY_BINS 2d histogram so the payload stops growing
+WEBGL_THRESHOLD = int(os.environ.get('SEC_WEBGL_THRESHOLD', 1000))
+DENSITY_THRESHOLD = int(os.environ.get('SEC_DENSITY_THRESHOLD', 20000))
+DENSITY_BINS = int(os.environ.get('SEC_DENSITY_BINS', 50))
+
+# Most outliers drawn per box in the network figures
+BOX_OUTLIERS = int(os.environ.get('SEC_BOX_OUTLIERS', 50))
+
+####### REGISTRY ###################################################################
+_builders = {}
+_figures = {}
+_data = {'version': 0}
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+# one lock per figure name, held while that figure is built
+_locks = {}
+
+# Decorator to register a figure builder under a name
+def figure(name):
+    def register(builder):
+        _builders[name] = builder
+        return builder
+    return register
+
+# Give the registry the data the figures are built from, drops built figures
+# and bumps the data version so caches keyed on it stop matching
+def set_data(MERGED, df):
+    with _lock:
+        _data['MERGED'] = MERGED
+        _data['df'] = df
+        _data['version'] += 1
+        _figures.clear()
+
+# Version of the data the figures are built from
+def data_version():
+    return _data['version']
+
+# Lock of one figure, so different figures are built in parallel
+def _figure_lock(name):
+    with _lock:
+        return _locks.setdefault(name, threading.Lock())
+
+# Build a figure on first use and memoize it
+# a figure built from data replaced by set_data meanwhile is not kept
+def get_figure(name):
+    fig = _figures.get(name)
+    if fig is None:
+        with _figure_lock(name):
+            fig = _figures.get(name)
+            if fig is None:
+                with _lock:
+                    _stats['misses'] += 1
+                    MERGED, df, version = _data['MERGED'], _data['df'], _data['version']
+                with phase('figure:' + name):
+                    fig = _builders[name](MERGED, df)
+                with _lock:
+                    if _data['version'] == version:
+                        _figures[name] = fig
+                return fig
+    _stats['hits'] += 1
+    return fig
+
+# Hits and misses of get_figure, like functools.lru_cache's cache_info()
+def figure_cache_info():
+    return CacheInfo(_stats['hits'], _stats['misses'], None, len(_figures))
+
+# Names of the registered figures
+def figure_names():
+    return list(_builders)
+
+# Faded logo in the background of a figure, referenced by URL
+def add_background_logo(fig, path='logos/SEC.png', opacity=0.1):
+    fig.add_layout_image(
+        dict(
+            source= logo_url(path),
+            xref="x domain",
+            yref="y domain",
+            x=0.5,
+            y=0.5,
+            xanchor="center",
+            yanchor="middle",
+            sizex=45,
+            sizey=0.9,
+            opacity=opacity,
+            layer='below')
+        )
+    return fig
+
+# Individual ranks, teams, views and percent cap, home teams followed by visitors
+def individual_ranks(MERGED):
+    ranks = list(MERGED['rank_home']) + list(MERGED['rank_vis'])
+    teams = list(MERGED['homename']) + list(MERGED['visname'])
+    views = list(MERGED['VIEWERS']) * 2
+    attend = list(MERGED['Percent_of_Capacity']) * 2
+    return ranks, teams, views, attend
+
+# Marker trace for the scatter figures, switches to WebGL or a binned
+# density heatmap as the number of points grows
+def scatter_trace(x, y, text, hovertemplate):
+    import plotly.graph_objects as go
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) > DENSITY_THRESHOLD:
+        keep = np.isfinite(x) & np.isfinite(y)
+        counts, xedges, yedges = np.histogram2d(x[keep], y[keep], bins=DENSITY_BINS)
+        # empty bins are left blank so the background logo shows through
+        z = np.where(counts.T > 0, counts.T, np.nan)
+        return go.Heatmap(x=(xedges[:-1] + xedges[1:]) / 2, y=(yedges[:-1] + yedges[1:]) / 2, z=z,
+                          colorscale='Blues', colorbar=dict(title='Games'),
+                          hovertemplate="<b>Games: </b> %{z} <extra></extra>")
+    scatter = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return scatter(x=x, y=y, mode='markers',
+                   marker=dict(color='navy'),
+                   text=text,
+                   hovertemplate=hovertemplate)
+
+# Box statistics of a column for every network, computed on the server
+# Returns one row per network (busiest first) with q1, median, q3 and the
+# 1.5 IQR whiskers, plus a capped, evenly spaced sample of the outliers
+def box_stats(MERGED, column):
+    values = MERGED[['Network', column]].dropna()
+    grouped = values.groupby('Network', observed=True)[column]
+    stats = grouped.describe()
+    iqr = stats['75%'] - stats['25%']
+    low = (stats['25%'] - 1.5*iqr).reindex(values['Network']).values
+    high = (stats['75%'] + 1.5*iqr).reindex(values['Network']).values
+    inside = (values[column].values >= low) & (values[column].values <= high)
+    fences = values[inside].groupby('Network', observed=True)[column].agg(['min', 'max'])
+    stats = pd.DataFrame({'q1':stats['25%'], 'median':stats['50%'], 'q3':stats['75%'],
+                          'lowerfence':fences['min'], 'upperfence':fences['max'],
+                          'count':stats['count']}).sort_values('count', ascending=False)
+    outliers = {}
+    for network, points in values.loc[~inside, column].groupby(values.loc[~inside, 'Network'], observed=True):
+        points = np.sort(points.values)
+        if len(points) > BOX_OUTLIERS:
+            points = points[np.linspace(0, len(points) - 1, BOX_OUTLIERS).astype(int)]
+        outliers[network] = points
+    return stats, outliers
+
+# One box per network from precomputed statistics, with its outliers as markers
+def add_network_boxes(fig, MERGED, column):
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+    stats, outliers = box_stats(MERGED, column)
+    for i, (network, row) in enumerate(stats.iterrows()):
+        color = qualitative.Plotly[i % len(qualitative.Plotly)]
+        fig.add_trace(go.Box(x=[network], name=network, legendgroup=network, marker_color=color,
+                             q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+                             lowerfence=[row['lowerfence']], upperfence=[row['upperfence']]))
+        if network in outliers:
+            points = outliers[network]
+            fig.add_trace(go.Scatter(x=[network]*len(points), y=points, mode='markers',
+                                     legendgroup=network, showlegend=False, marker_color=color,
+                                     hovertemplate="%{y}<extra>" + network + "</extra>"))
+    return fig
+
+
+################### TAB 1 ################################################################
+# avg viewers graph
+@figure('viewership')
+def build_viewership(MERGED, df):
+    import plotly.express as px
+    viewership = px.bar(data_frame=df,x='Team',y='AvgViews')
+    # no average line when the tab 1 filters leave no games
+    if df['AvgViews'].notna().any():
+        viewership.add_hline(df['AvgViews'].mean(),
+                    line_dash='dot',
+                    annotation_text="<b>Average:<b> "+str("{:,}".format(np.int64(df['AvgViews'].mean()))),
+                    annotation_position="top right",
+                    annotation_font_size=12,
+                    annotation_font_color="red")
+    viewership.update_layout(title={
+                'text':"Average TV Views Per Game by School",
+                'y':0.9,
+                'x':0.5,
+                'xanchor': 'center',
+                'yanchor': 'top'},
+            title_font_color="black",
+            xaxis_title="School",
+            yaxis_title="Number of Views")
+    viewership.update_traces(marker_color='navy')
+    viewership.layout.template = 'plotly_white'
+    return viewership
+
+# avg attendance graph
+@figure('attendance')
+def build_attendance(MERGED, df):
+    import plotly.express as px
+    attendance = px.bar(data_frame=df,x='Team',y='Avgattend')
+    if df['Avgattend'].notna().any():
+        attendance.add_hline(df['Avgattend'].mean(),
+                    line_dash='dot',
+                    annotation_text="<b>Average:<b> "+str(np.round(df['Avgattend'].mean()*100,1))+'%',
+                    annotation_position="top right",
+                    annotation_font_size=12,
+                    annotation_font_color="red")
+    attendance.update_traces(marker_color='navy')
+    attendance.update_layout(title={
+                'text':"Average Percent of Capacity Per Game by School",
+                'y':0.9,
+                'x':0.5,
+                'xanchor': 'center',
+                'yanchor': 'top'},
+            title_font_color="black",
+            xaxis_title="School",
+            yaxis_title="Percent of Capacity",
+            yaxis={'tickformat':".0%"})
+    attendance.layout.template = 'plotly_white'
+    return attendance
+
+
+################### TAB 3 ################################################################
+# summed rank graph
+@figure('summed_ranks')
+def build_summed_ranks(MERGED, df):
+    import plotly.graph_objects as go
+    summed_ranks = go.Figure(data=[scatter_trace(MERGED['added_rank'], MERGED['VIEWERS'], MERGED['added_rank'],
+                                     "<b>Summed Rank of Teams: </b> %{text} <br>")])
+    summed_ranks.update_xaxes(range=[0,51.5], title_text = 'Summed Rank of Teams per Game')
+    summed_ranks.update_yaxes(title_text = 'Viewers per Game')
+    summed_ranks.update_layout(title_text='Viewership by Matchup Weight')
+    add_background_logo(summed_ranks)
+    summed_ranks.update_layout(template="plotly_white")
+    return summed_ranks
+
+# Figure for summed ranks against percent capacity
+@figure('summed_rank_attend')
+def build_summed_rank_attend(MERGED, df):
+    import plotly.graph_objects as go
+    summed_rank_attend= go.Figure(data=[scatter_trace(MERGED['added_rank'], MERGED['Percent_of_Capacity'], MERGED['added_rank'],
+                                     "<b>Summed Rank of Teams: </b> %{text} <br>")])
+    summed_rank_attend.update_xaxes(range=[0,51.5], title_text = 'Summed Rank of Teams per Game')
+    summed_rank_attend.update_yaxes(range=[.6,1.2], title_text = 'Percent of Capacity per Game')
+    summed_rank_attend.update_layout(title_text='Percent of Capacity by Matchup Weight',yaxis={'tickformat':".0%"})
+    add_background_logo(summed_rank_attend)
+    summed_rank_attend.update_layout(template="plotly_white")
+    return summed_rank_attend
+
+# Networks Graph and summed ranks
+@figure('networks')
+def build_networks(MERGED, df):
+    import plotly.graph_objects as go
+    networks = add_network_boxes(go.Figure(), MERGED, 'added_rank')
+    add_background_logo(networks)
+    networks.update_layout(template="plotly_white")
+    networks.update_xaxes( title_text = 'Network')
+    networks.update_yaxes(title_text = 'Summed Rank')
+    networks.update_layout(title_text='Weighted Matchup Distribution by Network')
+    return networks
+
+# Viewership by network graph
+@figure('network_views')
+def build_network_views(MERGED, df):
+    import plotly.graph_objects as go
+    network_views = add_network_boxes(go.Figure(), MERGED, 'VIEWERS')
+    add_background_logo(network_views)
+    network_views.update_layout(template="plotly_white")
+    network_views.update_xaxes( title_text = 'Network')
+    network_views.update_yaxes(title_text = 'Number of Views')
+    network_views.update_layout(title_text='TV Viewership Distribution by Network')
+    return network_views
+
+# Figure for ranks of single teams
+@figure('ranks_views')
+def build_ranks_views(MERGED, df):
+    import plotly.graph_objects as go
+    ranks, teams, views, attend = individual_ranks(MERGED)
+    ranks_views = go.Figure(data=[scatter_trace(ranks, views, teams,
+                                     "<b>Team: </b> %{text} <br>")])
+    add_background_logo(ranks_views)
+    ranks_views.update_layout(template="plotly_white")
+    ranks_views.update_xaxes( title_text = 'Ranking')
+    ranks_views.update_yaxes(title_text = 'Views')
+    ranks_views.update_layout(title_text='Viewership by Ranking')
+    return ranks_views
+
+# Figure with ranks against percent capacity
+@figure('ranks_attend')
+def build_ranks_attend(MERGED, df):
+    import plotly.graph_objects as go
+    ranks, teams, views, attend = individual_ranks(MERGED)
+    ranks_attend = go.Figure(data=[scatter_trace(ranks, attend, teams,
+                                     "<b>Team: </b> %{text} <br>")])
+    add_background_logo(ranks_attend)
+    ranks_attend.update_layout(template="plotly_white")
+    ranks_attend.update_xaxes( title_text = 'Ranking')
+    ranks_attend.update_yaxes(title_text = 'Percent of Capacity')
+    ranks_attend.update_layout(title_text='Percent of Capacity by Ranking',yaxis={'tickformat':".0%"})
+    return ranks_attend
@@ -0,0 +1,19 @@
+# gunicorn settings for the dashboard
+#   gunicorn -c gunicorn.conf.py wsgi:server
+import multiprocessing
+import os
+
+bind = os.environ.get('SEC_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('SEC_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('SEC_THREADS', 2))
+
+# load data and build figures once in the master before forking
+preload_app = True
+
+# with SEC_WARMUP=background each worker fills its caches in the background
+# once it is up, see warmup.py
+def post_worker_init(worker):
+    if os.environ.get('SEC_WARMUP', 'preload') == 'background':
+        from app import warmup_tasks
+        from warmup import start_warmup
+        start_warmup(warmup_tasks())
@@ -0,0 +1,66 @@
+# Team logos served as cached static assets
+# Each logo is decoded, downsized and re-encoded as a PNG once per process and
+# served from /logos/<file> with long-lived cache headers and an ETag.
+# Figures and layouts reference logos by URL instead of embedding the image,
+# so the browser downloads each logo once instead of in every payload.
+
+import hashlib
+import io
+import os
+from functools import lru_cache
+
+LOGO_DIR = 'logos'
+LOGO_ROUTE = '/logos/'
+
+# largest width/height a served logo is scaled down to
+LOGO_MAX_SIZE = int(os.environ.get('SEC_LOGO_MAX_SIZE', 256))
+
+# a year, the URL changes whenever the logo file does
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Logo files that can be served
+@lru_cache(maxsize=None)
+def logo_files():
+    return frozenset(f for f in os.listdir(LOGO_DIR) if f.lower().endswith('.png'))
+
+# ETag of a logo, a hash of the source file and the size it is scaled to
+# only reads the file, PIL is not needed until the logo is actually requested
+@lru_cache(maxsize=None)
+def logo_etag(name):
+    h = hashlib.sha1(str(LOGO_MAX_SIZE).encode())
+    with open(os.path.join(LOGO_DIR, name), 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()[:12]
+
+# URL for a logo path like 'logos/UA.png', versioned by its ETag
+def logo_url(path):
+    name = os.path.basename(path.replace('\\', '/'))
+    return '%s%s?v=%s' % (LOGO_ROUTE, name, logo_etag(name))
+
+# Decode, downsize and re-encode a logo once
+# some of the source files are really jpegs, everything is served as png
+@lru_cache(maxsize=None)
+def logo_bytes(name):
+    from PIL import Image
+    with Image.open(os.path.join(LOGO_DIR, name)) as image:
+        image = image.convert('RGBA')
+        image.thumbnail((LOGO_MAX_SIZE, LOGO_MAX_SIZE))
+        out = io.BytesIO()
+        image.save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+# Add the logo route to the Flask server behind Dash
+def register_logo_route(server):
+    from flask import Response, abort, request
+
+    @server.route(LOGO_ROUTE + '<name>')
+    def serve_logo(name):
+        if name not in logo_files():
+            abort(404)
+        etag = logo_etag(name)
+        headers = {'Cache-Control': CACHE_CONTROL, 'ETag': '"%s"' % etag}
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        return Response(logo_bytes(name), mimetype='image/png', headers=headers)
+
+    return serve_logo
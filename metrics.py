@@ -0,0 +1,149 @@
+# Metrics for the dashboard, served in the Prometheus text format at /metrics
+# Every server side Dash callback is timed through the Flask request hooks on
+# the callback route: latency and response size histograms and error counts,
+# labelled by the callback's outputs. Startup phases (csv read, merges,
+# feature engineering, figure builds) and cache hits/misses are included.
+# Metrics are per process, with several workers each one reports its own.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+import profiling
+
+# only answer /metrics for requests from this host unless turned off
+METRICS_LOCAL_ONLY = os.environ.get('SEC_METRICS_LOCAL_ONLY', '1') == '1'
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [1000, 10000, 100000, 1000000, 10000000]
+
+CALLBACK_ROUTE = '_dash-update-component'
+
+_lock = threading.Lock()
+_phases = {}
+_callbacks = {}
+_caches = {}
+
+####### RECORDING ###################################################################
+# Time a startup phase, repeated phases add up
+# the phase is also profiled when it was selected with SEC_PROFILE
+@contextmanager
+def phase(name):
+    profiler = profiling.start() if profiling.PROFILE and profiling.wants(name) else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            _phases[name] = _phases.get(name, 0) + seconds
+        if profiler is not None:
+            profiling.finish(profiler, 'phase ' + name)
+
+# A cache to report, info() returns an object with hits, misses and currsize
+# like the cache_info() of functools.lru_cache
+def register_cache(name, info):
+    _caches[name] = info
+
+def _histogram(buckets):
+    return {'buckets': buckets, 'counts': [0]*len(buckets), 'sum': 0.0, 'count': 0}
+
+def _observe(histogram, value):
+    for i, bound in enumerate(histogram['buckets']):
+        if value <= bound:
+            histogram['counts'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+# Record one callback call
+def observe_callback(callback, seconds, size, error):
+    with _lock:
+        stats = _callbacks.get(callback)
+        if stats is None:
+            stats = _callbacks[callback] = {'latency': _histogram(LATENCY_BUCKETS),
+                                            'size': _histogram(SIZE_BUCKETS), 'errors': 0}
+        _observe(stats['latency'], seconds)
+        _observe(stats['size'], size)
+        stats['errors'] += error
+
+
+####### EXPOSITION ##################################################################
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    for bound, count in zip(histogram['buckets'], histogram['counts']):
+        lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, count))
+    lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram['count']))
+    lines.append('%s_sum{%s} %r' % (name, labels, histogram['sum']))
+    lines.append('%s_count{%s} %d' % (name, labels, histogram['count']))
+    return lines
+
+# Every metric in the Prometheus text exposition format
+def render():
+    lines = []
+    with _lock:
+        lines.append('# HELP sec_startup_phase_seconds Time spent in each startup phase')
+        lines.append('# TYPE sec_startup_phase_seconds gauge')
+        for name, seconds in sorted(_phases.items()):
+            lines.append('sec_startup_phase_seconds{phase="%s"} %r' % (_label(name), seconds))
+
+        callbacks = sorted(_callbacks.items())
+        lines.append('# HELP sec_callback_latency_seconds Dash callback latency')
+        lines.append('# TYPE sec_callback_latency_seconds histogram')
+        for callback, stats in callbacks:
+            lines.extend(_histogram_lines('sec_callback_latency_seconds',
+                                          'callback="%s"' % _label(callback), stats['latency']))
+        lines.append('# HELP sec_callback_response_bytes Size of the serialized callback response')
+        lines.append('# TYPE sec_callback_response_bytes histogram')
+        for callback, stats in callbacks:
+            lines.extend(_histogram_lines('sec_callback_response_bytes',
+                                          'callback="%s"' % _label(callback), stats['size']))
+        lines.append('# HELP sec_callback_errors_total Dash callbacks that failed')
+        lines.append('# TYPE sec_callback_errors_total counter')
+        for callback, stats in callbacks:
+            lines.append('sec_callback_errors_total{callback="%s"} %d' % (_label(callback), stats['errors']))
+
+    caches = sorted((name, info()) for name, info in _caches.items())
+    for metric, field, kind, help_text in [('sec_cache_hits_total', 'hits', 'counter', 'Cache hits'),
+                                           ('sec_cache_misses_total', 'misses', 'counter', 'Cache misses'),
+                                           ('sec_cache_entries', 'currsize', 'gauge', 'Entries in the cache')]:
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s %s' % (metric, kind))
+        for name, info in caches:
+            lines.append('%s{cache="%s"} %d' % (metric, _label(name), getattr(info, field)))
+    return '\n'.join(lines) + '\n'
+
+
+####### FLASK HOOKS #################################################################
+# Time the callback requests and add the /metrics route to the Flask server
+# callbacks maps the outputs of the app's callbacks (Dash's app.callback_map),
+# outputs sent by a client that are not in it are all counted as unknown so
+# made up ones cannot add labels without bound
+def register_metrics(server, callbacks):
+    from flask import Response, abort, g, request
+
+    @server.before_request
+    def start_timer():
+        if request.path.endswith(CALLBACK_ROUTE):
+            g.sec_callback_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        start = g.pop('sec_callback_start', None)
+        if start is not None:
+            body = request.get_json(silent=True)
+            output = body.get('output') if isinstance(body, dict) else None
+            callback = output if isinstance(output, str) and output in callbacks else 'unknown'
+            observe_callback(callback, time.perf_counter() - start,
+                             response.calculate_content_length() or 0, response.status_code >= 400)
+        return response
+
+    @server.route('/metrics')
+    def serve_metrics():
+        if METRICS_LOCAL_ONLY and request.remote_addr not in ('127.0.0.1', '::1'):
+            abort(403)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return serve_metrics
@@ -0,0 +1,130 @@
+# Opt-in profiling of Dash callbacks and startup phases
+# Nothing here runs unless it is turned on:
+#   SEC_PROFILE=all                      profile every callback and startup phase
+#   SEC_PROFILE=time-series1,read_csv    only callbacks whose outputs contain one of
+#                                        these, and startup phases with these names
+#   SEC_PROFILE_HEADER=1                 also profile any callback request sent with
+#                                        an 'X-SEC-Profile: 1' header
+# Profiles are written to SEC_PROFILE_DIR, named after the callback or phase and
+# its inputs (e.g. the team chosen in dropdown1), with a .json of the same name
+# describing them. SEC_PROFILE_MODE picks the profiler:
+#   cprofile  deterministic, writes a .prof file for pstats/snakeviz
+#   sample    samples the stack every SEC_PROFILE_INTERVAL seconds and writes
+#             a .folded file of collapsed stacks for flamegraph.pl/speedscope
+
+import cProfile
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE = os.environ.get('SEC_PROFILE', '')
+PROFILE_HEADER = os.environ.get('SEC_PROFILE_HEADER', '0') == '1'
+PROFILE_DIR = os.environ.get('SEC_PROFILE_DIR', 'profiles')
+PROFILE_MODE = os.environ.get('SEC_PROFILE_MODE', 'cprofile')
+PROFILE_INTERVAL = float(os.environ.get('SEC_PROFILE_INTERVAL', 0.001))
+
+HEADER = 'X-SEC-Profile'
+
+_selected = frozenset(name.strip() for name in PROFILE.split(',') if name.strip())
+_counter = itertools.count()
+# a thread can only run one profiler at a time, nested phases are part of the outer profile
+_active = threading.local()
+
+# Whether a callback output or phase name was selected with SEC_PROFILE
+def wants(name):
+    return 'all' in _selected or any(selected in name for selected in _selected)
+
+# Samples the stack of one thread from a background thread
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def finish(self):
+        self._done.set()
+        self.join()
+
+# Start profiling the current thread, None if it is already being profiled
+def start():
+    if getattr(_active, 'profiling', False):
+        return None
+    _active.profiling = True
+    if PROFILE_MODE == 'sample':
+        profiler = _Sampler(threading.get_ident(), PROFILE_INTERVAL)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-')[:80]
+
+# Stop a profiler and write what it collected, tagged with name and inputs
+def finish(profiler, name, inputs=None):
+    if profiler is None:
+        return None
+    _active.profiling = False
+    if isinstance(profiler, _Sampler):
+        profiler.finish()
+    else:
+        profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tag = ' '.join([name] + ['%s' % value for value in (inputs or {}).values()])
+    base = os.path.join(PROFILE_DIR, '%s-%d-%d-%s' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(),
+                                                       next(_counter), _slug(tag)))
+    if isinstance(profiler, _Sampler):
+        path = base + '.folded'
+        with open(path, 'w') as f:
+            for stack, count in profiler.stacks.most_common():
+                f.write('%s %d\n' % (stack, count))
+    else:
+        path = base + '.prof'
+        profiler.dump_stats(path)
+    with open(base + '.json', 'w') as f:
+        json.dump({'name': name, 'inputs': inputs or {}, 'mode': PROFILE_MODE, 'profile': path}, f, indent=2)
+    return path
+
+# Profile callback requests, only adds request hooks when profiling is turned on
+def register_profiling(server):
+    if not (_selected or PROFILE_HEADER):
+        return
+    from flask import g, request
+    from metrics import CALLBACK_ROUTE
+
+    @server.before_request
+    def start_profile():
+        if not request.path.endswith(CALLBACK_ROUTE):
+            return
+        body = request.get_json(silent=True) or {}
+        output = body.get('output', 'unknown')
+        if wants(output) or (PROFILE_HEADER and request.headers.get(HEADER) == '1'):
+            inputs = {'%s.%s' % (item.get('id'), item.get('property')): item.get('value')
+                      for item in body.get('inputs', []) if isinstance(item, dict)}
+            g.sec_profile = (start(), output, inputs)
+
+    @server.after_request
+    def finish_profile(response):
+        profile = g.pop('sec_profile', None)
+        if profile is not None:
+            finish(*profile)
+        return response
@@ -0,0 +1,134 @@
+# Weekly team reports as standalone HTML, without clicking through the app
+# Every team's percent of capacity and viewership figures (as tab 2 shows
+# them) and the tab 1 and tab 3 figures are rendered on a process pool.
+# The pages load one shared plotly.min.js and the logos from next to them,
+# so the output directory can be published as is. A manifest records the
+# inputs of every page and pages whose inputs have not changed are skipped.
+#   python report.py --out reports
+
+import argparse
+import copy
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logos import LOGO_DIR, LOGO_ROUTE, logo_files
+
+# Bump this when the pages change, so they are all rendered again
+REPORT_VERSION = 1
+
+BUNDLE = 'plotly.min.js'
+MANIFEST = 'manifest.json'
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<script src="%(bundle)s"></script>
+</head>
+<body>
+%(body)s
+</body>
+</html>
+'''
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-')
+
+def _hash(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+# Point the logos of a figure at the copies next to the pages instead of the app's route
+def _local_logos(fig):
+    for image in fig.get('layout', {}).get('images', []):
+        source = image.get('source') or ''
+        if source.startswith(LOGO_ROUTE):
+            image['source'] = 'logos/' + source[len(LOGO_ROUTE):].split('?')[0]
+    return fig
+
+def _write_page(path, title, figures):
+    import plotly.io as pio
+    body = '\n'.join(pio.to_html(_local_logos(copy.deepcopy(fig)), full_html=False, include_plotlyjs=False)
+                     for fig in figures)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(PAGE % {'title': html.escape(title), 'bundle': BUNDLE, 'body': body})
+    return path
+
+############## PAGES, rendered in the pool's processes ##############################################################
+# The tab 2 figure pair of one team
+def render_team(team, label, path):
+    import app
+    return _write_page(path, label, app.team_figures(team, app.data_version()))
+
+# One of the tab 1 or tab 3 figures
+def render_figure(name, path):
+    import app
+    return _write_page(path, name, [app.get_figure(name).to_dict()])
+
+############## DRIVER #############################################################################################
+# Pages to render as (file, inputs hash, function, arguments)
+# a team page depends on the team's series, color and logo, the other
+# figures on the source data
+def report_jobs():
+    import app
+    from data import fingerprint
+    from figures import figure_names
+    version = app.data_version()
+    jobs = []
+    for option in app.team_names_dict:
+        inputs = _hash([REPORT_VERSION, option['value'], app.team_series(option['value'], version)])
+        jobs.append(('team-%s.html' % _slug(option['label']), inputs, render_team, (option['value'], option['label'])))
+    key = fingerprint()
+    for name in figure_names():
+        jobs.append(('figure-%s.html' % _slug(name), _hash([REPORT_VERSION, name, key]), render_figure, (name,)))
+    return jobs
+
+# Render every page whose inputs changed since the last run into out
+# returns how many pages were rendered and how many there are
+def render_reports(out, workers=None, force=False):
+    from plotly.offline import get_plotlyjs
+    jobs = report_jobs()
+    os.makedirs(os.path.join(out, 'logos'), exist_ok=True)
+    bundle = os.path.join(out, BUNDLE)
+    if force or not os.path.exists(bundle):
+        with open(bundle, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+    for name in logo_files():
+        shutil.copyfile(os.path.join(LOGO_DIR, name), os.path.join(out, 'logos', name))
+
+    manifest_path = os.path.join(out, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    todo = [job for job in jobs
+            if force or manifest.get(job[0]) != job[1] or not os.path.exists(os.path.join(out, job[0]))]
+
+    # the workers are forked with the data already loaded where the platform allows it
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render, *args, os.path.join(out, page)): (page, inputs)
+                       for page, inputs, render, args in todo}
+            for future in as_completed(futures):
+                future.result()
+                page, inputs = futures[future]
+                manifest[page] = inputs
+    finally:
+        # pages that were rendered are not rendered again even if another one failed
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    return len(todo), len(jobs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every team comparison and figure to standalone HTML')
+    parser.add_argument('--out', default='reports', help='directory the pages are written to')
+    parser.add_argument('--workers', type=int, default=None, help='processes to render with (CPU count)')
+    parser.add_argument('--force', action='store_true', help='render every page even if its inputs did not change')
+    args = parser.parse_args()
+    rendered, total = render_reports(args.out, args.workers, args.force)
+    print('Rendered %d of %d pages into %s' % (rendered, total, args.out))
@@ -0,0 +1,54 @@
+# Ingesting a batch and rebuilding from the appended sources give the same data
+#   python -m pytest -q tests
+
+import os
+import shutil
+import pandas as pd
+import pytest
+import data
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# rated games in the batch, and how many of them are already in the sources
+BATCH_GAMES = 40
+OVERLAP = 10
+
+def _read_raw(name):
+    return pd.read_csv(os.path.join(REPO_DIR, name), dtype=str, keep_default_na=False)
+
+# Sources without the last BATCH_GAMES rated games, and a batch holding those
+# games plus OVERLAP games the sources already have, in a temporary directory
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    GAMES, RATINGS = _read_raw(data.GAMES_CSV), _read_raw(data.RATINGS_CSV)
+    rated = GAMES.loc[GAMES['TeamIDsDate'].isin(RATINGS['TeamIDsDate']), 'TeamIDsDate'].unique()
+    batch = rated[-(BATCH_GAMES + OVERLAP):]
+    held = rated[-BATCH_GAMES:]
+    GAMES[~GAMES['TeamIDsDate'].isin(held)].to_csv(tmp_path / data.GAMES_CSV, index=False)
+    RATINGS[~RATINGS['TeamIDsDate'].isin(held)].to_csv(tmp_path / data.RATINGS_CSV, index=False)
+    GAMES[GAMES['TeamIDsDate'].isin(batch)].to_csv(tmp_path / 'games-batch.csv', index=False)
+    RATINGS[RATINGS['TeamIDsDate'].isin(batch)].to_csv(tmp_path / 'ratings-batch.csv', index=False)
+    shutil.copyfile(os.path.join(REPO_DIR, data.CAPACITY_CSV), tmp_path / data.CAPACITY_CSV)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data, 'SNAPSHOT_DIR', str(tmp_path / 'cache'))
+    return held
+
+def test_ingest_matches_rebuild(sources):
+    before = len(data.build_merged(*data.read_sources()))
+    MERGED, cube, NEW = data.ingest_files('games-batch.csv', 'ratings-batch.csv')
+    assert set(NEW['TeamIDsDate']) == set(sources)
+    assert len(MERGED) == before + len(NEW)
+
+    REBUILT = data.build_merged(*data.read_sources())
+    pd.testing.assert_frame_equal(MERGED.reset_index(drop=True), REBUILT.reset_index(drop=True),
+                                  check_categorical=False)
+    # the ingested cube's counts are floats after adding with fill_value
+    pd.testing.assert_frame_equal(cube.sort_index(), data.build_cube(REBUILT).sort_index(),
+                                  check_dtype=False, check_like=True)
+
+def test_ingest_twice_adds_nothing(sources):
+    data.ingest_files('games-batch.csv', 'ratings-batch.csv')
+    sizes = [os.path.getsize(path) for path in data.SOURCE_FILES]
+    MERGED, cube, NEW = data.ingest_files('games-batch.csv', 'ratings-batch.csv')
+    assert len(NEW) == 0
+    assert [os.path.getsize(path) for path in data.SOURCE_FILES] == sizes
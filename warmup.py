@@ -0,0 +1,73 @@
+# Warm-up of the figure and layout caches, and the health/readiness endpoints
+# The warm-up tasks (static figures, every team's figure pair, tab layouts)
+# run on a thread pool in the background, so the server accepts connections
+# while the caches fill instead of the first users paying for the builds.
+#   /health  200 as soon as the process answers requests
+#   /ready   200 once every warm-up task has run, 503 with the progress until
+#            then, for a load balancer to only route traffic to hot workers
+# The caches live in the process, so threads are used rather than processes.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import phase
+
+# threads the warm-up tasks run on
+WARMUP_THREADS = int(os.environ.get('SEC_WARMUP_THREADS', 4))
+
+_lock = threading.Lock()
+_state = {'state': 'pending', 'total': 0, 'done': 0, 'failed': [], 'started': None, 'finished': None}
+
+# Run one task, a failed task is reported but does not stop the warm-up,
+# its cache is then filled by the first request instead
+def _run(name, task):
+    try:
+        task()
+        failed = None
+    except Exception as e:
+        print('Warm-up of %s failed: %s' % (name, e))
+        failed = name
+    with _lock:
+        _state['done'] += 1
+        if failed is not None:
+            _state['failed'].append(failed)
+
+# Run the warm-up tasks, a list of (name, callable), and wait for all of them
+def warm_up(tasks, threads=WARMUP_THREADS):
+    with _lock:
+        _state.update(state='warming', total=len(tasks), done=0, failed=[], started=time.time(), finished=None)
+    with phase('warmup'), ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix='warmup') as pool:
+        for name, task in tasks:
+            pool.submit(_run, name, task)
+    with _lock:
+        _state.update(state='ready', finished=time.time())
+
+# Run warm_up in a background thread and return right away
+def start_warmup(tasks, threads=WARMUP_THREADS):
+    thread = threading.Thread(target=warm_up, args=(tasks, threads), name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Progress of the warm-up: pending, warming or ready, tasks done out of total
+def status():
+    with _lock:
+        current = dict(_state, failed=list(_state['failed']))
+    if current['started'] is not None:
+        current['seconds'] = (current['finished'] or time.time()) - current['started']
+    return current
+
+# Add the /health and /ready routes to the Flask server
+def register_health(server):
+    from flask import jsonify
+
+    @server.route('/health')
+    def health():
+        return jsonify(status='ok')
+
+    @server.route('/ready')
+    def ready():
+        current = status()
+        return jsonify(current), 200 if current['state'] == 'ready' else 503
+
+    return ready
@@ -0,0 +1,29 @@
+# WSGI entry point for production serving
+# Run with a preforking server that imports the app once in the master, e.g.
+#   gunicorn -c gunicorn.conf.py wsgi:server
+# Data loading and figure precomputation happen here, before the workers are
+# forked, so every worker shares MERGED and the built figures copy-on-write.
+# With SEC_WARMUP=background the figures are instead built by each worker in
+# the background after it starts serving (see post_worker_init in
+# gunicorn.conf.py), and /ready answers 503 until they are.
+
+import gc
+import os
+
+# numeric columns of MERGED live in memory-mapped files shared by all workers
+os.environ.setdefault('SEC_MMAP_COLUMNS', '1')
+
+# preload: build the caches here before forking, background: in each worker
+WARMUP = os.environ.get('SEC_WARMUP', 'preload')
+
+from app import app, precompute
+
+if WARMUP == 'preload':
+    precompute()
+
+server = app.server
+application = server
+
+# move everything built so far out of the garbage collector's reach, so
+# collections in the workers do not touch (and copy) the shared pages
+gc.freeze()